@@ -1,40 +1,269 @@
-import sqlite3
+import argparse
+import csv
+import hashlib
+import sys
+from datetime import datetime
+from itertools import islice
+
+import tenants
+from db import connect, current_db, query, run_write, set_current
+
+BATCH_SIZE = 1000
+
+
+class DryRun(Exception):
+    """Raised inside a batch transaction to roll it back after counting what it would do."""
+
+
+def hash_password(password):
+    return hashlib.sha256(password.encode()).hexdigest()
 
-DB = "ttt_inventory.db"
 
 def show_users():
-    conn = sqlite3.connect(DB)
-    cur = conn.cursor()
-    cur.execute("SELECT username, role, hub FROM users")
-    rows = cur.fetchall()
-    conn.close()
+    rows = query("SELECT username, role, hub FROM users")
     print("\n👥 Current Users:")
     for r in rows:
         print(f" - {r[0]} ({r[1]}) — {r[2]}")
     print()
 
+
 def delete_user(username):
-    conn = sqlite3.connect(DB)
-    cur = conn.cursor()
-    cur.execute("DELETE FROM users WHERE username = ?", (username,))
-    conn.commit()
-    conn.close()
+    query("DELETE FROM users WHERE username = ?", (username,), fetch=False)
     print(f"✅ Deleted user: {username}\n")
 
+
 def reset_user_password(username, new_password):
-    import hashlib
-    hashed = hashlib.sha256(new_password.encode()).hexdigest()
-    conn = sqlite3.connect(DB)
-    cur = conn.cursor()
-    cur.execute("UPDATE users SET password = ? WHERE username = ?", (hashed, username))
-    conn.commit()
-    conn.close()
+    query("UPDATE users SET password = ? WHERE username = ?", (hash_password(new_password), username), fetch=False)
     print(f"🔐 Password reset for user: {username}")
 
-if __name__ == "__main__":
-    print("== TTT Admin Tools ==")
-    show_users()
 
-    # EXAMPLES — Uncomment to use:
-    delete_user("vendor")
-    # reset_user_password("smooth", "retailpass")
+# --- Batched imports ---
+def _batches(rows, size):
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, size))
+        if not batch:
+            return
+        yield batch
+
+
+def _read_csv(path):
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        for row in csv.DictReader(f):
+            yield {k.strip().lower(): (v or "").strip() for k, v in row.items() if k}
+
+
+def _run_batches(label, rows, apply, size, dry_run):
+    # apply(cur, batch) -> (done, skipped); each batch commits (or rolls back) on its own
+    done = skipped = seen = 0
+    for batch in _batches(rows, size):
+        outcome = {}
+
+        def tx(cur):
+            outcome["result"] = apply(cur, batch)
+            if dry_run:
+                raise DryRun()
+        try:
+            run_write(tx)
+        except DryRun:
+            pass
+        d, s = outcome["result"]
+        done, skipped, seen = done + d, skipped + s, seen + len(batch)
+        print(f"\r{label}: {seen} rows read, {done} applied, {skipped} skipped", end="", file=sys.stderr, flush=True)
+    print(file=sys.stderr)
+    print(f"{'🧪 Dry run — nothing written. ' if dry_run else '✅ '}{label}: {done} applied, {skipped} skipped")
+    return done, skipped
+
+
+def import_users(path, size=BATCH_SIZE, dry_run=False, update=False):
+    def apply(cur, batch):
+        rows = [(r["username"], hash_password(r["password"]), r.get("role", "Retail"), r.get("hub", ""))
+                for r in batch if r.get("username") and r.get("password")]
+        verb = "INSERT OR REPLACE" if update else "INSERT OR IGNORE"
+        # rowcount, unlike total_changes(), leaves out rows written by triggers
+        cur.executemany(f"{verb} INTO users (username, password, role, hub) VALUES (?, ?, ?, ?)", rows)
+        changed = max(cur.rowcount, 0)
+        return changed, len(batch) - changed
+    return _run_batches("Users", _read_csv(path), apply, size, dry_run)
+
+
+def import_skus(path, size=BATCH_SIZE, dry_run=False):
+    # Columns: sku, product_name (optional), assigned_hubs ("Hub 1,Retail"; optional, default the
+    # retail stores), barcode (optional)
+    tenants.ensure_hubs_table()
+    default_hubs = ",".join(tenants.hub_names("Retail"))
+
+    def apply(cur, batch):
+        info, stock, codes = [], [], []
+        for r in batch:
+            if not r.get("sku"):
+                continue
+            hubs = sorted({h.strip() for h in (r.get("assigned_hubs") or default_hubs).split(",") if h.strip()})
+            info.append((r["sku"], r.get("product_name") or r["sku"], ",".join(hubs)))
+            stock.extend((r["sku"], h, 0) for h in hubs)
+            if r.get("barcode"):
+                codes.append((r["barcode"], r["sku"]))
+        cur.executemany(
+            """INSERT INTO sku_info (sku, product_name, assigned_hubs) VALUES (?, ?, ?)
+               ON CONFLICT(sku) DO UPDATE SET product_name=excluded.product_name, assigned_hubs=excluded.assigned_hubs""",
+            info
+        )
+        cur.executemany("INSERT OR IGNORE INTO inventory (sku, hub, quantity) VALUES (?, ?, ?)", stock)
+        cur.executemany("INSERT OR REPLACE INTO sku_barcodes (code, sku) VALUES (?, ?)", codes)
+        return len(info), len(batch) - len(info)
+    return _run_batches("SKUs", _read_csv(path), apply, size, dry_run)
+
+
+def adjust_stock(path, user, size=BATCH_SIZE, dry_run=False):
+    # Columns: sku, hub, delta (+IN / -OUT), comment (optional). Rows that would drive
+    # stock below zero are skipped, like Bulk Update.
+    def apply(cur, batch):
+        running, log_rows = {}, []
+        now = datetime.now().isoformat()
+        skipped = 0
+        for r in batch:
+            try:
+                delta = int(r.get("delta") or r.get("qty") or 0)
+            except ValueError:
+                delta = 0
+            key = (r.get("sku"), r.get("hub"))
+            if not all(key) or delta == 0:
+                skipped += 1
+                continue
+            if key not in running:
+                row = cur.execute("SELECT quantity FROM inventory WHERE sku=? AND hub=?", key).fetchone()
+                running[key] = row[0] if row else 0
+            if running[key] + delta < 0:
+                print(f"\n❌ Not enough '{key[0]}' at {key[1]} (Now: {running[key]}, Tried: {delta})", file=sys.stderr)
+                skipped += 1
+                continue
+            running[key] += delta
+            log_rows.append((now, user, key[0], key[1], "IN" if delta > 0 else "OUT", abs(delta), r.get("comment", "")))
+        inv_rows = [(sku, h, q) for (sku, h), q in running.items()]
+        cur.executemany(
+            """INSERT INTO inventory (sku, hub, quantity) VALUES (?, ?, ?)
+               ON CONFLICT(sku, hub) DO UPDATE SET quantity=excluded.quantity""",
+            inv_rows
+        )
+        cur.executemany("INSERT INTO logs VALUES (?, ?, ?, ?, ?, ?, ?)", log_rows)
+        return len(log_rows), skipped
+    return _run_batches("Stock adjustments", _read_csv(path), apply, size, dry_run)
+
+
+def import_shipments(path, size=BATCH_SIZE, dry_run=False):
+    # Either one row per shipment with a "skus" column ("SKU x 3, SKU2 x 1"), or one row
+    # per line item with sku/qty columns; line items sharing a tracking number are merged.
+    shipments = {}
+    for r in _read_csv(path):
+        key = r.get("tracking")
+        if not key:
+            continue
+        s = shipments.setdefault(key, {**r, "lines": []})
+        if r.get("skus"):
+            s["lines"].append(r["skus"])
+        elif r.get("sku"):
+            s["lines"].append(f"{r['sku']} x {r.get('qty') or 1}")
+
+    def apply(cur, batch):
+        rows = [(s.get("supplier", ""), s["tracking"], s.get("carrier", ""), s.get("hub", ""),
+                 ", ".join(s["lines"]), s.get("date") or str(datetime.today().date()), s.get("status") or "Pending")
+                for s in batch if s["lines"]]
+        cur.executemany(
+            "INSERT INTO shipments (supplier, tracking, carrier, hub, skus, date, status) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            rows
+        )
+        return len(rows), len(batch) - len(rows)
+    return _run_batches("Shipments", shipments.values(), apply, size, dry_run)
+
+
+def export_table(table, out=sys.stdout, size=BATCH_SIZE):
+    allowed = {r[0] for r in query("SELECT name FROM sqlite_master WHERE type IN ('table', 'view')")}
+    if table not in allowed:
+        raise SystemExit(f"Unknown table: {table}")
+    conn = connect()
+    try:
+        cur = conn.execute(f"SELECT * FROM {table}")
+        writer = csv.writer(out)
+        writer.writerow([d[0] for d in cur.description])
+        while True:
+            rows = cur.fetchmany(size)
+            if not rows:
+                break
+            writer.writerows(rows)
+    finally:
+        conn.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="TTT Admin Tools")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--tenant", help="Tenant to work on (multi-tenant mode, KISS_TENANT_DIR)")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("users", help="List users")
+    p = sub.add_parser("delete-user", help="Delete a user")
+    p.add_argument("username")
+    p = sub.add_parser("reset-password", help="Reset a user's password")
+    p.add_argument("username")
+    p.add_argument("password")
+    for name, help_text in [("import-users", "Import users from CSV (username,password,role,hub)"),
+                            ("import-skus", "Import SKUs and hub assignments from CSV (sku,product_name,assigned_hubs,barcode)"),
+                            ("adjust-stock", "Apply stock adjustments from CSV (sku,hub,delta,comment)"),
+                            ("import-shipments", "Import shipments from CSV (supplier,tracking,carrier,hub,skus|sku+qty,date)")]:
+        p = sub.add_parser(name, help=help_text)
+        p.add_argument("csv")
+        p.add_argument("--dry-run", action="store_true", help="Validate and count without writing")
+        if name == "import-users":
+            p.add_argument("--update", action="store_true", help="Overwrite existing users")
+        if name == "adjust-stock":
+            p.add_argument("--user", default="admin_tools", help="Username recorded in logs")
+    p = sub.add_parser("export", help="Stream a table as CSV to stdout")
+    p.add_argument("table")
+    p = sub.add_parser("init-tenant", help="Create a tenant database with its hubs and first admin")
+    p.add_argument("name")
+    p.add_argument("--hubs", default="Hub 1,Hub 2,Hub 3", help="Comma-separated hub names")
+    p.add_argument("--retail", default="Retail", help="Comma-separated retail store names")
+    p.add_argument("--admin", default="admin")
+    p.add_argument("--password", required=True)
+    p = sub.add_parser("add-hub", help="Add a hub to the database (use --tenant in multi-tenant mode)")
+    p.add_argument("name")
+    p.add_argument("--retail", action="store_true", help="Add a retail store instead of a hub")
+    args = parser.parse_args(argv)
+
+    if args.tenant:
+        path = tenants.tenant_path(args.tenant)
+        if not path:
+            raise SystemExit(f"Unknown tenant: {args.tenant}")
+        set_current(path)
+    elif tenants.MULTI_TENANT and args.command != "init-tenant":
+        raise SystemExit("Multi-tenant mode: pass --tenant NAME")
+
+    if args.command == "users":
+        print(f"== TTT Admin Tools ({current_db()}) ==")
+        show_users()
+    elif args.command == "delete-user":
+        delete_user(args.username)
+    elif args.command == "reset-password":
+        reset_user_password(args.username, args.password)
+    elif args.command == "import-users":
+        import_users(args.csv, args.batch_size, args.dry_run, args.update)
+    elif args.command == "import-skus":
+        import_skus(args.csv, args.batch_size, args.dry_run)
+    elif args.command == "adjust-stock":
+        adjust_stock(args.csv, args.user, args.batch_size, args.dry_run)
+    elif args.command == "import-shipments":
+        import_shipments(args.csv, args.batch_size, args.dry_run)
+    elif args.command == "export":
+        export_table(args.table, size=args.batch_size)
+    elif args.command == "init-tenant":
+        split = lambda names: [n.strip() for n in names.split(",") if n.strip()]
+        hubs = [(h, "Hub") for h in split(args.hubs)] + [(h, "Retail") for h in split(args.retail)]
+        path = tenants.init_tenant(args.name, hubs, args.admin, args.password)
+        print(f"🏢 Tenant '{args.name}' created at {path} with {len(hubs)} hubs; admin login: {args.admin}")
+    elif args.command == "add-hub":
+        tenants.ensure_hubs_table()
+        tenants.add_hubs([(args.name, "Retail" if args.retail else "Hub")])
+        print(f"➕ Hubs: {', '.join(tenants.hub_names())}")
+
+
+if __name__ == "__main__":
+    main()
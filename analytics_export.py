@@ -0,0 +1,234 @@
+import argparse
+import json
+import shutil
+import sqlite3
+from datetime import datetime
+from pathlib import Path
+from urllib.parse import quote, unquote
+
+from db import DB
+
+BATCH_SIZE = 50_000
+STATE_FILE = "_export_state.json"
+
+# Column types for every exported dataset. Partition columns (month/hub) are
+# encoded in the directory names and left out of the Parquet files themselves.
+SCHEMAS = {
+    "logs": [("timestamp", "string"), ("user", "string"), ("sku", "string"), ("hub", "string"),
+             ("action", "string"), ("qty", "int64"), ("comment", "string")],
+    "inventory": [("sku", "string"), ("hub", "string"), ("quantity", "int64")],
+    "shipments": [("id", "int64"), ("supplier", "string"), ("tracking", "string"), ("carrier", "string"),
+                  ("hub", "string"), ("skus", "string"), ("date", "string"), ("status", "string")],
+    "daily": [("day", "string"), ("hub", "string"), ("sku", "string"), ("action", "string"),
+              ("units", "int64"), ("entries", "int64")],
+}
+
+
+def _arrow():
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        import pyarrow.ipc as ipc
+    except ImportError:
+        raise SystemExit("pyarrow is required for analytics exports: pip install pyarrow")
+    return pa, pq, ipc
+
+
+def _schema(pa, name, drop=()):
+    types = {"string": pa.string(), "int64": pa.int64()}
+    return pa.schema([(col, types[t]) for col, t in SCHEMAS[name] if col not in drop])
+
+
+def _batches(conn, sql, params=(), size=BATCH_SIZE):
+    cur = conn.execute(sql, params)
+    while True:
+        rows = cur.fetchmany(size)
+        if not rows:
+            break
+        yield rows
+
+
+def _to_batch(pa, schema, rows, columns):
+    cols = list(zip(*rows))
+    arrays = [pa.array(cols[columns.index(f.name)], type=f.type) for f in schema]
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+# log_entries.ts is naive local time in microseconds since the epoch
+def _month_start_us(month):
+    if month < "1970-01":
+        return -2 ** 63
+    return int((datetime.strptime(month, "%Y-%m") - datetime(1970, 1, 1)).total_seconds()) * 1_000_000
+
+
+def _load_state(dest):
+    path = dest / STATE_FILE
+    return json.loads(path.read_text()) if path.exists() else {}
+
+
+def _save_state(dest, state):
+    tmp = dest / f".{STATE_FILE}.tmp"
+    tmp.write_text(json.dumps(state, indent=2))
+    tmp.replace(dest / STATE_FILE)
+
+
+class _PartitionWriters:
+    """Keeps one open Parquet writer per (month, hub) partition.
+
+    Files are written under a temporary name and only renamed into place by close(),
+    so an interrupted run never leaves a partial file behind.
+    """
+
+    def __init__(self, pa, pq, root, schema, name):
+        self.pa, self.pq = pa, pq
+        self.root, self.schema, self.name = root, schema, name
+        self.writers = {}
+        self.rows = 0
+
+    def write(self, rows, columns, key_of):
+        groups = {}
+        for r in rows:
+            groups.setdefault(key_of(r), []).append(r)
+        for key, part in groups.items():
+            entry = self.writers.get(key)
+            if entry is None:
+                folder = self.root
+                for name, value in key:
+                    folder = folder / f"{name}={quote(str(value), safe='')}"
+                folder.mkdir(parents=True, exist_ok=True)
+                tmp = folder / f".{self.name}.parquet.tmp"
+                entry = (self.pq.ParquetWriter(tmp, self.schema), tmp, folder / f"{self.name}.parquet")
+                self.writers[key] = entry
+            entry[0].write_batch(_to_batch(self.pa, self.schema, part, columns))
+            self.rows += len(part)
+
+    def close(self, keep=True):
+        for writer, tmp, final in self.writers.values():
+            writer.close()
+            if keep:
+                tmp.replace(final)
+            else:
+                tmp.unlink(missing_ok=True)
+        self.writers.clear()
+
+    def write_all(self, batches, columns, key_of):
+        try:
+            for rows in batches:
+                self.write(rows, columns, key_of)
+        except BaseException:
+            self.close(keep=False)
+            raise
+        self.close()
+        return self.rows
+
+
+def export_parquet(dest, db=DB, full=False):
+    pa, pq, _ = _arrow()
+    dest = Path(dest)
+    dest.mkdir(parents=True, exist_ok=True)
+    state = {} if full else _load_state(dest)
+    run_id = datetime.now().strftime("%Y%m%dT%H%M%S%f")
+    summary = {}
+    with sqlite3.connect(db) as conn:
+        # logs: append-only ledger, exported incrementally past the last entry id seen.
+        # Each batch is committed (files renamed into place, then state saved) on its own;
+        # files are named after the batch's first id, so a retry after a crash overwrites
+        # the same files instead of appending duplicate rows.
+        if full:
+            shutil.rmtree(dest / "logs", ignore_errors=True)
+        cols = ["id"] + [c for c, _ in SCHEMAS["logs"]]
+        schema = _schema(pa, "logs", drop=("hub",))
+        summary["logs"] = 0
+        for rows in _batches(conn, f"SELECT {', '.join(cols)} FROM log_rows WHERE id > ? ORDER BY id",
+                             (state.get("logs_rowid", 0),)):
+            writers = _PartitionWriters(pa, pq, dest / "logs", schema, f"part-{rows[0][0]:012d}")
+            summary["logs"] += writers.write_all([rows], cols, lambda r: (("month", (r[1] or "")[:7]), ("hub", r[4])))
+            # daily_from: earliest month whose daily aggregates are stale ("" sorts before all)
+            first = min((r[1] or "")[:7] for r in rows)
+            state["daily_from"] = min(first, state.get("daily_from", first))
+            state["logs_rowid"] = rows[-1][0]
+            _save_state(dest, state)
+
+        # daily aggregates: rebuilt for every month touched by the new log rows. Rows with
+        # no parseable timestamp (ts NULL) are grouped by their text, as in the Arrow export.
+        if full:
+            shutil.rmtree(dest / "daily", ignore_errors=True)
+            state["daily_from"] = ""
+        first_month = state.get("daily_from")
+        if first_month is not None:
+            for folder in (dest / "daily").glob("month=*"):
+                if unquote(folder.name.split("=", 1)[1]) >= first_month:
+                    shutil.rmtree(folder)
+            cols = [c for c, _ in SCHEMAS["daily"]]
+            writers = _PartitionWriters(pa, pq, dest / "daily", _schema(pa, "daily", drop=("hub",)), f"part-{run_id}")
+            summary["daily"] = writers.write_all(_batches(conn, """
+                    SELECT substr(timestamp, 1, 10) AS day, hub, sku, action, SUM(qty), COUNT(*)
+                    FROM log_rows WHERE ts >= ? OR (ts IS NULL AND substr(COALESCE(timestamp, ''), 1, 7) >= ?)
+                    GROUP BY day, hub, sku, action ORDER BY day""", (_month_start_us(first_month), first_month)),
+                cols, lambda r: (("month", (r[0] or "")[:7]), ("hub", r[1])))
+            del state["daily_from"]
+            _save_state(dest, state)
+
+        # inventory and shipments are mutable: rewritten as snapshots each run
+        for table, sql, key_of in [
+            ("inventory", "SELECT sku, hub, quantity FROM inventory",
+             lambda r: (("hub", r[1]),)),
+            ("shipments", "SELECT id, supplier, tracking, carrier, hub, skus, date, status FROM shipments",
+             lambda r: (("month", (r[6] or "")[:7]), ("hub", r[4]))),
+        ]:
+            tmp = dest / f".{table}-{run_id}"
+            cols = [c for c, _ in SCHEMAS[table]]
+            writers = _PartitionWriters(pa, pq, tmp, _schema(pa, table, drop=("hub",)), f"part-{run_id}")
+            try:
+                summary[table] = writers.write_all(_batches(conn, sql), cols, key_of)
+            except BaseException:
+                shutil.rmtree(tmp, ignore_errors=True)
+                raise
+            shutil.rmtree(dest / table, ignore_errors=True)
+            if tmp.exists():
+                tmp.rename(dest / table)
+    _save_state(dest, state)
+    return summary
+
+
+def export_arrow(dest, db=DB):
+    pa, _, ipc = _arrow()
+    dest = Path(dest)
+    dest.mkdir(parents=True, exist_ok=True)
+    queries = {
+        "logs": "SELECT timestamp, user, sku, hub, action, qty, comment FROM log_rows ORDER BY id",
+        "inventory": "SELECT sku, hub, quantity FROM inventory",
+        "shipments": "SELECT id, supplier, tracking, carrier, hub, skus, date, status FROM shipments",
+        "daily": """SELECT substr(timestamp, 1, 10) AS day, hub, sku, action, SUM(qty), COUNT(*)
+                    FROM logs GROUP BY day, hub, sku, action ORDER BY day""",
+    }
+    summary = {}
+    with sqlite3.connect(db) as conn:
+        for table, sql in queries.items():
+            schema = _schema(pa, table)
+            cols = [f.name for f in schema]
+            tmp = dest / f".{table}.arrow.tmp"
+            count = 0
+            # Uncompressed IPC files so notebooks can pa.memory_map() them without copying
+            with pa.OSFile(str(tmp), "wb") as sink, ipc.new_file(sink, schema) as writer:
+                for rows in _batches(conn, sql):
+                    writer.write_batch(_to_batch(pa, schema, rows, cols))
+                    count += len(rows)
+            tmp.replace(dest / f"{table}.arrow")
+            summary[table] = count
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export logs, inventory, shipments and daily aggregates for analytics.")
+    parser.add_argument("dest", help="Output directory")
+    parser.add_argument("--format", choices=["parquet", "arrow"], default="parquet")
+    parser.add_argument("--full", action="store_true", help="Re-export everything instead of appending new logs")
+    parser.add_argument("--db", default=str(DB))
+    args = parser.parse_args()
+    if args.format == "parquet":
+        result = export_parquet(args.dest, db=args.db, full=args.full)
+    else:
+        result = export_arrow(args.dest, db=args.db)
+    for table, rows in result.items():
+        print(f"📦 {table}: {rows} rows")
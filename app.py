@@ -1,10 +1,16 @@
 import streamlit as st
-import sqlite3
 import pandas as pd
-from datetime import datetime
-from pathlib import Path
+from datetime import datetime, timedelta
 import hashlib
-import io
+import html
+import sqlite3
+import time
+from db import DB, query, run_write, set_current, is_locked, metrics as lock_metrics
+import maintenance
+import tenants
+import exports
+import reconcile
+import notifier
 
 # --- Language Translations (English/Chinese) ---
 if "lang" not in st.session_state:
@@ -89,6 +95,37 @@ translations = {
         "inventory_count_mode": "Inventory Count Mode",
         "confirmed_counts": "Confirmed Counts",
         "export_inventory": "Export Inventory",
+        "ops_dashboard": "📈 Operations Dashboard",
+        "units_per_day": "Units IN/OUT per Day",
+        "units_per_week": "Units IN/OUT per Week",
+        "lead_times": "Shipment Receive Lead Times (days)",
+        "top_movers": "Top Movers",
+        "rebuild_aggregates": "Rebuild Aggregates",
+        "start_count": "Start Cycle Count",
+        "save_count": "Save Progress",
+        "post_count": "Post Adjustments",
+        "cancel_count": "Cancel Count",
+        "variance": "Variances",
+        "count_sessions": "Count Sessions",
+        "maintenance": "🧹 Database Maintenance",
+        "run_maintenance": "Run Maintenance Now",
+        "scan_mode": "📷 Scan Mode",
+        "scan_code": "Scan barcode or SKU",
+        "commit_scans": "Commit Scans",
+        "clear_scans": "Clear Scans",
+        "barcode": "Barcode (optional)",
+        "prepare_export": "Prepare",
+        "reconcile": "🧾 Inventory Reconciliation",
+        "run_reconcile": "Run Reconciliation",
+        "post_corrections": "Post Corrections",
+        "create_checkpoint": "Create Checkpoint",
+        "transfers": "🔁 Inter-Hub Transfers",
+        "from_hub": "From Hub",
+        "to_hub": "To Hub",
+        "create_transfer": "Send Transfer",
+        "receive_transfer": "Receive Transfer",
+        "cancel_transfer": "Cancel Transfer",
+        "in_transit": "In Transit",
     },
     "zh": {
         "supplier_shipments": "🚚 供应商发货",
@@ -166,18 +203,73 @@ translations = {
         "inventory_count_mode": "库存盘点模式",
         "confirmed_counts": "已确认盘点",
         "export_inventory": "导出库存",
+        "ops_dashboard": "📈 运营仪表板",
+        "units_per_day": "每日入库/出库数量",
+        "units_per_week": "每周入库/出库数量",
+        "lead_times": "发货收货周期（天）",
+        "top_movers": "周转最快的SKU",
+        "rebuild_aggregates": "重建汇总数据",
+        "start_count": "开始循环盘点",
+        "save_count": "保存进度",
+        "post_count": "过账调整",
+        "cancel_count": "取消盘点",
+        "variance": "差异",
+        "count_sessions": "盘点记录",
+        "maintenance": "🧹 数据库维护",
+        "run_maintenance": "立即运行维护",
+        "scan_mode": "📷 扫码模式",
+        "scan_code": "扫描条码或SKU",
+        "commit_scans": "提交扫描",
+        "clear_scans": "清空扫描",
+        "barcode": "条码（可选）",
+        "prepare_export": "生成",
+        "reconcile": "🧾 库存对账",
+        "run_reconcile": "运行对账",
+        "post_corrections": "过账更正",
+        "create_checkpoint": "创建期初检查点",
+        "transfers": "🔁 仓库间调拨",
+        "from_hub": "调出仓库",
+        "to_hub": "调入仓库",
+        "create_transfer": "发出调拨",
+        "receive_transfer": "接收调拨",
+        "cancel_transfer": "取消调拨",
+        "in_transit": "在途",
     }
 }
 
 def T(key): return translations[st.session_state["lang"]].get(key, key)
-DB = Path(__file__).parent / "ttt_inventory.db"
 
-def query(sql, params=(), fetch=True, commit=True):
-    with sqlite3.connect(DB) as conn:
-        cur = conn.cursor()
-        cur.execute(sql, params)
-        if commit: conn.commit()
-        return cur.fetchall() if fetch else None    
+# --- Stock Movements ---
+# moves: (sku, hub, delta, comment). Every move is checked and applied inside one
+# write transaction, so concurrent workers can't interleave their read-modify-writes.
+def post_movements(moves, user, all_or_nothing=False):
+    def tx(cur):
+        running, applied, errors = {}, [], []
+        for sku, h, delta, comment in moves:
+            if (sku, h) not in running:
+                row = cur.execute("SELECT quantity FROM inventory WHERE sku=? AND hub=?", (sku, h)).fetchone()
+                running[(sku, h)] = row[0] if row else 0
+            current = running[(sku, h)]
+            if current + delta < 0:
+                errors.append((sku, h, current, delta))
+                continue
+            running[(sku, h)] = current + delta
+            applied.append((sku, h, delta, current + delta, comment))
+        if errors and all_or_nothing:
+            return [], errors
+        now = datetime.now().isoformat()
+        cur.executemany(
+            """INSERT INTO inventory (sku, hub, quantity) VALUES (?, ?, ?)
+               ON CONFLICT(sku, hub) DO UPDATE SET quantity=excluded.quantity""",
+            [(sku, h, new_qty) for sku, h, _, new_qty, _ in applied]
+        )
+        cur.executemany(
+            "INSERT INTO logs VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [(now, user, sku, h, "IN" if delta > 0 else "OUT", abs(delta), comment)
+             for sku, h, delta, _, comment in applied]
+        )
+        return [(sku, h, delta, new_qty) for sku, h, delta, new_qty, _ in applied], errors
+    return run_write(tx)
 
 # --- Seed Data (SKUs & Users) ---
 def seed_all_skus():
@@ -270,14 +362,7 @@ def create_tables():
         hub TEXT,
         quantity INTEGER,
         PRIMARY KEY (sku, hub))""", fetch=False, commit=True)
-    query("""CREATE TABLE IF NOT EXISTS logs (
-        timestamp TEXT,
-        user TEXT,
-        sku TEXT,
-        hub TEXT,
-        action TEXT,
-        qty INTEGER,
-        comment TEXT)""", fetch=False, commit=True)
+    create_log_storage()
     query("""CREATE TABLE IF NOT EXISTS sku_info (
         sku TEXT PRIMARY KEY,
         product_name TEXT,
@@ -302,6 +387,607 @@ def create_tables():
         username TEXT,
         hub TEXT,
         confirmed_at TEXT)""", fetch=False, commit=True)
+    query("""CREATE TABLE IF NOT EXISTS count_sessions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        hub TEXT,
+        username TEXT,
+        started_at TEXT,
+        status TEXT,
+        posted_at TEXT,
+        posted_by TEXT)""", fetch=False, commit=True)
+    query("""CREATE TABLE IF NOT EXISTS count_lines (
+        session_id INTEGER,
+        sku TEXT,
+        system_qty INTEGER,
+        counted_qty INTEGER,
+        variance INTEGER,
+        PRIMARY KEY (session_id, sku))""", fetch=False, commit=True)
+    # Barcode aliases; several codes (case pack, unit, old label) may point at one SKU
+    query("""CREATE TABLE IF NOT EXISTS sku_barcodes (
+        code TEXT PRIMARY KEY,
+        sku TEXT)""", fetch=False, commit=True)
+    query("CREATE INDEX IF NOT EXISTS idx_sku_barcodes_sku ON sku_barcodes (sku)", fetch=False, commit=True)
+    # Inter-hub transfers: stock leaves the source hub on send and sits in transit
+    # (the open transfer's lines) until the destination receives it
+    query("""CREATE TABLE IF NOT EXISTS transfers (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        from_hub TEXT,
+        to_hub TEXT,
+        status TEXT,
+        note TEXT,
+        created_by TEXT,
+        created_at TEXT,
+        closed_by TEXT,
+        closed_at TEXT)""", fetch=False, commit=True)
+    query("""CREATE TABLE IF NOT EXISTS transfer_lines (
+        transfer_id INTEGER,
+        sku TEXT,
+        qty INTEGER,
+        PRIMARY KEY (transfer_id, sku))""", fetch=False, commit=True)
+    # Soft deletes only flip status; remember when, so maintenance can purge after a retention window
+    query("""CREATE TABLE IF NOT EXISTS shipment_deletions (
+        shipment_id INTEGER PRIMARY KEY,
+        deleted_at TEXT)""", fetch=False, commit=True)
+    query("""CREATE TRIGGER IF NOT EXISTS trg_shipments_deleted AFTER UPDATE OF status ON shipments
+        WHEN NEW.status='Deleted' AND OLD.status IS NOT 'Deleted'
+        BEGIN
+            INSERT OR REPLACE INTO shipment_deletions (shipment_id, deleted_at)
+            VALUES (NEW.id, strftime('%Y-%m-%dT%H:%M:%f', 'now', 'localtime'));
+        END""", fetch=False, commit=True)
+    tenants.ensure_hubs_table(seed=None if tenants.MULTI_TENANT else tenants.DEFAULT_HUBS)
+    maintenance.ensure_table()
+    exports.ensure_tables()
+    reconcile.ensure_tables()
+    create_throughput_tables()
+    create_search_index()
+    create_counter_tables()
+    notifier.ensure_tables(LOW_STOCK)
+
+# --- Compact Log Storage ---
+# log_entries stores SKU/hub/user as integer ids into small dictionary tables and the
+# timestamp as integer microseconds since the epoch (naive local wall-clock time, exactly
+# what datetime.now().isoformat() wrote before). The `logs` view decodes it back to the
+# original seven text columns, and an INSTEAD OF trigger encodes inserts, so existing
+# "INSERT INTO logs" / "SELECT * FROM logs" code and the CSV exports are unchanged.
+# `log_rows` adds id and ts so ordered queries can use the integer index.
+def ts_int_sql(x):
+    return (f"(CAST(strftime('%s', substr({x}, 1, 19)) AS INTEGER) * 1000000"
+            f" + CAST(substr(substr({x}, 21) || '000000', 1, 6) AS INTEGER))")
+
+def ts_text_sql(t):
+    return (f"(strftime('%Y-%m-%dT%H:%M:%S', {t} / 1000000, 'unixepoch')"
+            f" || CASE WHEN {t} % 1000000 = 0 THEN '' ELSE printf('.%06d', {t} % 1000000) END)")
+
+# Timestamps that wouldn't round-trip byte-for-byte (other formats) keep their text in raw_ts
+def raw_ts_sql(x):
+    return f"CASE WHEN {ts_text_sql(ts_int_sql(x))} IS {x} THEN NULL ELSE {x} END"
+
+# Dictionary rows are only ever added, never replaced: an outer INSERT OR REPLACE (Restore)
+# turns OR IGNORE inside a trigger into REPLACE, which would re-create the row under a new id.
+def dim_insert_sql(dim, value):
+    return f"INSERT INTO {dim} (name) SELECT {value} WHERE {value} IS NOT NULL AND NOT EXISTS (SELECT 1 FROM {dim} WHERE name = {value});"
+
+def _create_log_objects(cur):
+    for dim in ("dim_skus", "dim_hubs", "dim_users"):
+        cur.execute(f"CREATE TABLE IF NOT EXISTS {dim} (id INTEGER PRIMARY KEY, name TEXT UNIQUE)")
+    cur.execute("""CREATE TABLE IF NOT EXISTS log_entries (
+        id INTEGER PRIMARY KEY,
+        ts INTEGER,
+        raw_ts TEXT,
+        user_id INTEGER,
+        sku_id INTEGER,
+        hub_id INTEGER,
+        action TEXT,
+        qty INTEGER,
+        comment TEXT)""")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_log_entries_ts ON log_entries (ts)")
+    cur.execute(f"""CREATE VIEW IF NOT EXISTS log_rows AS
+        SELECT e.id, e.ts, COALESCE(e.raw_ts, {ts_text_sql('e.ts')}) AS timestamp,
+               u.name AS user, s.name AS sku, h.name AS hub, e.action, e.qty, e.comment
+        FROM log_entries e
+        LEFT JOIN dim_users u ON u.id = e.user_id
+        LEFT JOIN dim_skus s ON s.id = e.sku_id
+        LEFT JOIN dim_hubs h ON h.id = e.hub_id""")
+    cur.execute("""CREATE VIEW IF NOT EXISTS logs AS
+        SELECT timestamp, user, sku, hub, action, qty, comment FROM log_rows""")
+    # Older databases have the OR IGNORE version of this trigger
+    old = cur.execute("SELECT sql FROM sqlite_master WHERE name='trg_logs_insert'").fetchone()
+    if old and "OR IGNORE" in old[0]:
+        cur.execute("DROP TRIGGER trg_logs_insert")
+    cur.execute(f"""CREATE TRIGGER IF NOT EXISTS trg_logs_insert INSTEAD OF INSERT ON logs
+        BEGIN
+            {dim_insert_sql('dim_users', 'NEW.user')}
+            {dim_insert_sql('dim_skus', 'NEW.sku')}
+            {dim_insert_sql('dim_hubs', 'NEW.hub')}
+            INSERT INTO log_entries (ts, raw_ts, user_id, sku_id, hub_id, action, qty, comment)
+            VALUES ({ts_int_sql('NEW.timestamp')}, {raw_ts_sql('NEW.timestamp')},
+                    (SELECT id FROM dim_users WHERE name = NEW.user),
+                    (SELECT id FROM dim_skus WHERE name = NEW.sku),
+                    (SELECT id FROM dim_hubs WHERE name = NEW.hub),
+                    NEW.action, NEW.qty, NEW.comment);
+        END""")
+
+def _migrate_legacy_logs(cur):
+    # Re-checked inside the write transaction: another worker may have migrated it meanwhile
+    cur.execute("SELECT type FROM sqlite_master WHERE name='logs'")
+    if cur.fetchone() != ("table",):
+        _create_log_objects(cur)
+        return False
+    cur.execute("ALTER TABLE logs RENAME TO logs_legacy")
+    _create_log_objects(cur)
+    for dim, col in (("dim_users", "user"), ("dim_skus", "sku"), ("dim_hubs", "hub")):
+        cur.execute(f"INSERT OR IGNORE INTO {dim} (name) SELECT DISTINCT {col} FROM logs_legacy WHERE {col} IS NOT NULL")
+    cur.execute(f"""INSERT INTO log_entries (ts, raw_ts, user_id, sku_id, hub_id, action, qty, comment)
+        SELECT {ts_int_sql('l.timestamp')}, {raw_ts_sql('l.timestamp')}, u.id, s.id, h.id, l.action, l.qty, l.comment
+        FROM logs_legacy l
+        LEFT JOIN dim_users u ON u.name = l.user
+        LEFT JOIN dim_skus s ON s.name = l.sku
+        LEFT JOIN dim_hubs h ON h.name = l.hub
+        ORDER BY l.rowid""")
+    cur.execute("DROP TABLE logs_legacy")
+    return True
+
+def create_log_storage():
+    legacy = query("SELECT type FROM sqlite_master WHERE name='logs'")
+    if legacy and legacy[0][0] == "table":
+        if not run_write(_migrate_legacy_logs):
+            return
+        try:
+            query("VACUUM", fetch=False, commit=False)
+        except sqlite3.OperationalError as e:
+            if not is_locked(e):
+                raise  # busy: the maintenance vacuum reclaims the space later
+    else:
+        run_write(_create_log_objects)
+
+# --- Throughput Aggregates (kept current by triggers on log_entries) ---
+def create_throughput_tables():
+    fresh = not query("SELECT name FROM sqlite_master WHERE type='table' AND name='throughput_daily'")
+    query("""CREATE TABLE IF NOT EXISTS throughput_daily (
+        day TEXT,
+        hub TEXT,
+        units_in INTEGER DEFAULT 0,
+        units_out INTEGER DEFAULT 0,
+        PRIMARY KEY (day, hub))""", fetch=False, commit=True)
+    query("""CREATE TABLE IF NOT EXISTS sku_daily (
+        day TEXT,
+        hub TEXT,
+        sku TEXT,
+        units_in INTEGER DEFAULT 0,
+        units_out INTEGER DEFAULT 0,
+        PRIMARY KEY (day, hub, sku))""", fetch=False, commit=True)
+    query("""CREATE TABLE IF NOT EXISTS shipment_lead_times (
+        shipment_id INTEGER PRIMARY KEY,
+        hub TEXT,
+        shipped TEXT,
+        received TEXT,
+        lead_days REAL)""", fetch=False, commit=True)
+    log_day = "COALESCE(substr(NEW.raw_ts, 1, 10), strftime('%Y-%m-%d', NEW.ts / 1000000, 'unixepoch'))"
+    log_hub = "(SELECT name FROM dim_hubs WHERE id = NEW.hub_id)"
+    log_sku = "(SELECT name FROM dim_skus WHERE id = NEW.sku_id)"
+    query(f"""CREATE TRIGGER IF NOT EXISTS trg_log_entries_throughput AFTER INSERT ON log_entries
+        WHEN NEW.action IN ('IN', 'OUT')
+        BEGIN
+            INSERT INTO throughput_daily (day, hub, units_in, units_out)
+            VALUES ({log_day}, {log_hub},
+                    CASE WHEN NEW.action='IN' THEN NEW.qty ELSE 0 END,
+                    CASE WHEN NEW.action='OUT' THEN NEW.qty ELSE 0 END)
+            ON CONFLICT(day, hub) DO UPDATE SET
+                units_in=units_in + excluded.units_in, units_out=units_out + excluded.units_out;
+            INSERT INTO sku_daily (day, hub, sku, units_in, units_out)
+            VALUES ({log_day}, {log_hub}, {log_sku},
+                    CASE WHEN NEW.action='IN' THEN NEW.qty ELSE 0 END,
+                    CASE WHEN NEW.action='OUT' THEN NEW.qty ELSE 0 END)
+            ON CONFLICT(day, hub, sku) DO UPDATE SET
+                units_in=units_in + excluded.units_in, units_out=units_out + excluded.units_out;
+        END""", fetch=False, commit=True)
+    # Receiving a shipment logs "IN ... Shipment <id>"; the first such entry fixes the lead time
+    # NOT EXISTS rather than OR IGNORE, which an outer INSERT OR REPLACE (Restore) turns into REPLACE
+    log_time = f"COALESCE(NEW.raw_ts, {ts_text_sql('NEW.ts')})"
+    old = query("SELECT sql FROM sqlite_master WHERE name='trg_log_entries_lead_time'")
+    if old and "OR IGNORE" in old[0][0]:
+        query("DROP TRIGGER trg_log_entries_lead_time", fetch=False, commit=True)
+    query(f"""CREATE TRIGGER IF NOT EXISTS trg_log_entries_lead_time AFTER INSERT ON log_entries
+        WHEN NEW.action='IN' AND NEW.comment LIKE 'Shipment %'
+        BEGIN
+            INSERT INTO shipment_lead_times (shipment_id, hub, shipped, received, lead_days)
+            SELECT id, hub, date, {log_time}, ROUND(julianday({log_time}) - julianday(date), 2)
+            FROM shipments WHERE id = CAST(substr(NEW.comment, 10) AS INTEGER)
+            AND NOT EXISTS (SELECT 1 FROM shipment_lead_times WHERE shipment_id = shipments.id);
+        END""", fetch=False, commit=True)
+    if fresh:
+        rebuild_throughput()
+
+# --- Full-Text Search (FTS5, kept in sync by triggers) ---
+# One index for SKUs, log comments, messages and shipments. A document's rowid is
+# source_id * 8 + kind, so triggers can replace or delete it with a rowid lookup.
+# SKUs use their dim_skus id: sku_info has no integer key and VACUUM renumbers rowids.
+SEARCH_KINDS = {1: "SKU", 2: "Log", 3: "Message", 4: "Shipment"}
+SEARCH_SOURCES = {
+    # kind: (table, id, title, body, condition); {p} becomes NEW./OLD. in triggers
+    1: ("sku_info", "(SELECT id FROM dim_skus WHERE name = {p}sku)", "{p}sku",
+        "COALESCE({p}product_name, '') || ' ' || COALESCE({p}assigned_hubs, '')", None),
+    2: ("log_entries", "{p}id", "(SELECT name FROM dim_skus WHERE id = {p}sku_id)", "{p}comment", "{p}comment != ''"),
+    3: ("messages", "{p}id", "{p}thread", "{p}message", None),
+    4: ("shipments", "{p}id", "{p}tracking",
+        "COALESCE({p}carrier, '') || ' ' || COALESCE({p}skus, '') || ' ' || COALESCE({p}hub, '') || ' ' || COALESCE({p}supplier, '')", None),
+}
+
+SEARCH_PREP = {1: dim_insert_sql("dim_skus", "{p}sku")}
+
+def _search_doc_sql(kind, prefix):
+    table, key, title, body, cond = SEARCH_SOURCES[kind]
+    fill = lambda x: x.replace("{p}", prefix)
+    return f"{fill(key)} * 8 + {kind}", fill(title), fill(body), fill(cond) if cond else None
+
+def create_search_index():
+    if query("SELECT name FROM sqlite_master WHERE name='search_index'"):
+        fresh = False
+    else:
+        try:
+            query("""CREATE VIRTUAL TABLE search_index USING fts5(
+                title, body, prefix='2 3', tokenize='unicode61 remove_diacritics 2')""", fetch=False, commit=True)
+        except Exception:
+            return  # SQLite built without FTS5: the search box stays hidden
+        fresh = True
+    for kind, (table, key, *_rest) in SEARCH_SOURCES.items():
+        if kind in SEARCH_PREP:  # older databases prepared with OR IGNORE (see dim_insert_sql)
+            for name in (f"trg_search_{table}_ins", f"trg_search_{table}_upd"):
+                old = query("SELECT sql FROM sqlite_master WHERE name=?", (name,))
+                if old and "OR IGNORE" in old[0][0]:
+                    query(f"DROP TRIGGER {name}", fetch=False, commit=True)
+        doc_id, title, body, cond = _search_doc_sql(kind, "NEW.")
+        old_id = _search_doc_sql(kind, "OLD.")[0]
+        prep = SEARCH_PREP.get(kind, "").replace("{p}", "NEW.")
+        when = f" WHEN {cond}" if cond else ""
+        query(f"""CREATE TRIGGER IF NOT EXISTS trg_search_{table}_ins AFTER INSERT ON {table}{when}
+            BEGIN
+                {prep}
+                INSERT INTO search_index (rowid, title, body) VALUES ({doc_id}, {title}, {body});
+            END""", fetch=False, commit=True)
+        query(f"""CREATE TRIGGER IF NOT EXISTS trg_search_{table}_del AFTER DELETE ON {table}
+            BEGIN
+                DELETE FROM search_index WHERE rowid = {old_id};
+            END""", fetch=False, commit=True)
+        if table != "log_entries":
+            query(f"""CREATE TRIGGER IF NOT EXISTS trg_search_{table}_upd AFTER UPDATE ON {table}
+                BEGIN
+                    DELETE FROM search_index WHERE rowid = {old_id};
+                    {prep}
+                    INSERT INTO search_index (rowid, title, body) VALUES ({doc_id}, {title}, {body});
+                END""", fetch=False, commit=True)
+    if fresh:
+        rebuild_search_index()
+
+def rebuild_search_index():
+    def tx(cur):
+        cur.execute("DELETE FROM search_index")
+        for kind, (table, *_rest) in SEARCH_SOURCES.items():
+            doc_id, title, body, cond = _search_doc_sql(kind, "")
+            if kind in SEARCH_PREP:
+                cur.execute(f"INSERT OR IGNORE INTO dim_skus (name) SELECT sku FROM {table}")
+            cur.execute(f"INSERT INTO search_index (rowid, title, body) SELECT {doc_id}, {title}, {body} FROM {table} WHERE {cond or 1}")
+        cur.execute("INSERT INTO search_index (search_index) VALUES ('optimize')")
+    run_write(tx)
+
+def search_available():
+    return bool(query("SELECT name FROM sqlite_master WHERE name='search_index'"))
+
+# Ranked hits, filtered to what the current user may see
+def search_all(text, user, user_role, user_hub, limit=20):
+    terms = [t.replace('"', '""') for t in text.split() if t.strip()]
+    if not terms:
+        return []
+    match = " ".join(f'"{t}"*' for t in terms)
+    hits = query("""SELECT rowid % 8, rowid / 8, title, snippet(search_index, 1, '**', '**', '…', 10)
+                    FROM search_index WHERE search_index MATCH ? ORDER BY rank LIMIT ?""", (match, limit * 5))
+    by_kind = {}
+    for kind, ref, _, _ in hits:
+        by_kind.setdefault(kind, []).append(ref)
+    allowed = {}
+    for kind, refs in by_kind.items():
+        marks = ",".join("?" * len(refs))
+        if kind == 1:
+            rows = query(f"""SELECT d.id, s.assigned_hubs FROM sku_info s JOIN dim_skus d ON d.name = s.sku
+                             WHERE d.id IN ({marks})""", refs)
+        elif kind == 2:
+            rows = query(f"SELECT id, hub || ' · ' || action || ' ' || qty || ' · ' || timestamp FROM log_rows WHERE id IN ({marks})"
+                         + ("" if user_role == "Admin" else " AND hub = ?"), refs + ([] if user_role == "Admin" else [user_hub]))
+            rows = rows if user_role != "Supplier" else []
+        elif kind == 3:
+            rows = query(f"SELECT id, sender || ' → ' || receiver || ' · ' || timestamp FROM messages WHERE id IN ({marks})"
+                         + ("" if user_role == "Admin" else " AND (sender = ? OR receiver = ?)"),
+                         refs + ([] if user_role == "Admin" else [user, user]))
+        else:
+            extra, params = "", []
+            if user_role == "Supplier":
+                extra, params = " AND supplier = ?", [user]
+            elif user_role != "Admin":
+                extra, params = " AND hub = ?", [user_hub]
+            rows = query(f"SELECT id, hub || ' · ' || status || ' · ' || date FROM shipments WHERE id IN ({marks}) AND status != 'Deleted'{extra}",
+                         refs + params)
+        allowed.update({(kind, r[0]): r[1] for r in rows})
+    results = []
+    for kind, ref, title, snip in hits:
+        if (kind, ref) in allowed:
+            results.append((SEARCH_KINDS[kind], title, snip, allowed[(kind, ref)]))
+    return results[:limit]
+
+# Full recompute from logs: backfill for existing databases and periodic repair
+def rebuild_throughput():
+    run_write(_rebuild_throughput)
+
+def _rebuild_throughput(cur):
+    cur.execute("DELETE FROM throughput_daily")
+    cur.execute("DELETE FROM sku_daily")
+    cur.execute("DELETE FROM shipment_lead_times")
+    cur.execute("""INSERT INTO sku_daily (day, hub, sku, units_in, units_out)
+        SELECT substr(timestamp, 1, 10), hub, sku,
+               SUM(CASE WHEN action='IN' THEN qty ELSE 0 END),
+               SUM(CASE WHEN action='OUT' THEN qty ELSE 0 END)
+        FROM logs WHERE action IN ('IN', 'OUT')
+        GROUP BY substr(timestamp, 1, 10), hub, sku""")
+    cur.execute("""INSERT INTO throughput_daily (day, hub, units_in, units_out)
+        SELECT day, hub, SUM(units_in), SUM(units_out) FROM sku_daily GROUP BY day, hub""")
+    cur.execute("""INSERT INTO shipment_lead_times (shipment_id, hub, shipped, received, lead_days)
+        SELECT s.id, s.hub, s.date, MIN(l.timestamp), ROUND(julianday(MIN(l.timestamp)) - julianday(s.date), 2)
+        FROM logs l JOIN shipments s ON s.id = CAST(substr(l.comment, 10) AS INTEGER)
+        WHERE l.action='IN' AND l.comment LIKE 'Shipment %'
+        GROUP BY s.id""")
+
+def parse_shipment_skus(skus):
+    lines = []
+    for sku in [s.strip() for s in skus.split(",") if s.strip()]:
+        if " x " in sku:
+            name, qty = sku.rsplit(" x ", 1)
+            try:
+                qty = int(qty)
+            except:
+                qty = 1
+        else:
+            name = sku
+            qty = 1
+        lines.append((name, qty))
+    return lines
+
+# Stock, logs and the status flip commit together; a shipment that is no longer
+# Pending (received by another user/worker meanwhile) is left untouched.
+def receive_shipment(shipment_id, ship_hub, skus, user):
+    def tx(cur):
+        updated = cur.execute("UPDATE shipments SET status='Received' WHERE id=? AND status='Pending'", (shipment_id,))
+        if updated.rowcount == 0:
+            return False
+        now = datetime.now().isoformat()
+        for name, qty in parse_shipment_skus(skus):
+            cur.execute(
+                "INSERT INTO inventory (sku, hub, quantity) VALUES (?, ?, ?) ON CONFLICT(sku, hub) DO UPDATE SET quantity=quantity + excluded.quantity",
+                (name, ship_hub, qty)
+            )
+            cur.execute(
+                "INSERT INTO logs VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (now, user, name, ship_hub, "IN", qty, f"Shipment {shipment_id}")
+            )
+        return True
+    return run_write(tx)
+
+# --- Transfers ---
+# Each step is one transaction with set-based statements over transfer_lines, so a
+# transfer of hundreds of SKUs costs the same single round trip as one line.
+def create_transfer(from_hub, to_hub, lines, user, note=""):
+    totals = {}
+    for sku, qty in lines:
+        if qty > 0:
+            totals[sku] = totals.get(sku, 0) + int(qty)
+
+    def tx(cur):
+        cur.execute("SAVEPOINT transfer")
+        transfer_id = cur.execute(
+            "INSERT INTO transfers (from_hub, to_hub, status, note, created_by, created_at) VALUES (?, ?, 'In Transit', ?, ?, ?)",
+            (from_hub, to_hub, note, user, datetime.now().isoformat())).lastrowid
+        cur.executemany("INSERT INTO transfer_lines (transfer_id, sku, qty) VALUES (?, ?, ?)",
+                        [(transfer_id, sku, qty) for sku, qty in totals.items()])
+        short = cur.execute("""SELECT l.sku, COALESCE(i.quantity, 0), l.qty FROM transfer_lines l
+                               LEFT JOIN inventory i ON i.sku = l.sku AND i.hub = ?
+                               WHERE l.transfer_id = ? AND COALESCE(i.quantity, 0) < l.qty""",
+                            (from_hub, transfer_id)).fetchall()
+        if short:
+            cur.execute("ROLLBACK TO transfer")
+            cur.execute("RELEASE transfer")
+            return None, short
+        cur.execute("RELEASE transfer")
+        cur.execute("""UPDATE inventory SET quantity = quantity - (
+                           SELECT qty FROM transfer_lines WHERE transfer_id = ? AND sku = inventory.sku)
+                       WHERE hub = ? AND sku IN (SELECT sku FROM transfer_lines WHERE transfer_id = ?)""",
+                    (transfer_id, from_hub, transfer_id))
+        cur.execute("""INSERT INTO logs (timestamp, user, sku, hub, action, qty, comment)
+                       SELECT ?, ?, sku, ?, 'OUT', qty, ? FROM transfer_lines WHERE transfer_id = ?""",
+                    (datetime.now().isoformat(), user, from_hub, f"Transfer {transfer_id}", transfer_id))
+        return transfer_id, []
+    return run_write(tx)
+
+# Receiving books the lines IN at the destination; cancelling books them back at the source
+def close_transfer(transfer_id, user, receive=True):
+    def tx(cur):
+        row = cur.execute("SELECT from_hub, to_hub FROM transfers WHERE id=? AND status='In Transit'", (transfer_id,)).fetchone()
+        if not row:
+            return False
+        target = row[1] if receive else row[0]
+        now = datetime.now().isoformat()
+        cur.execute("UPDATE transfers SET status=?, closed_by=?, closed_at=? WHERE id=?",
+                    ("Received" if receive else "Cancelled", user, now, transfer_id))
+        cur.execute("""INSERT INTO inventory (sku, hub, quantity)
+                       SELECT sku, ?, qty FROM transfer_lines WHERE transfer_id = ?
+                       ON CONFLICT(sku, hub) DO UPDATE SET quantity = quantity + excluded.quantity""",
+                    (target, transfer_id))
+        cur.execute("""INSERT INTO logs (timestamp, user, sku, hub, action, qty, comment)
+                       SELECT ?, ?, sku, ?, 'IN', qty, ? FROM transfer_lines WHERE transfer_id = ?""",
+                    (now, user, target, f"Transfer {transfer_id}" + ("" if receive else " cancelled"), transfer_id))
+        return True
+    return run_write(tx)
+
+# --- Sidebar Counters (kept current by triggers) ---
+# hub_counters holds per-hub badge numbers and user_counters unread threads per user,
+# so the sidebar reads them with a primary-key lookup instead of scanning tables.
+LOW_STOCK = 10
+
+def _counter_delta(h, pending="0", low="0", units="0"):
+    return f"""INSERT INTO hub_counters (hub, pending_shipments, low_stock_skus, units_on_hand)
+               VALUES (COALESCE({h}, ''), {pending}, {low}, {units})
+               ON CONFLICT(hub) DO UPDATE SET
+                   pending_shipments = pending_shipments + excluded.pending_shipments,
+                   low_stock_skus = low_stock_skus + excluded.low_stock_skus,
+                   units_on_hand = units_on_hand + excluded.units_on_hand;"""
+
+def _refresh_thread_sql(p):
+    # Latest message decides whether a thread is unread; recount only this thread's receivers
+    return f"""INSERT OR REPLACE INTO message_threads (thread, last_sender, last_at)
+                   SELECT thread, sender, timestamp FROM messages WHERE thread = {p}thread
+                   ORDER BY timestamp DESC, id DESC LIMIT 1;
+               DELETE FROM message_threads WHERE thread = {p}thread
+                   AND NOT EXISTS (SELECT 1 FROM messages WHERE thread = {p}thread);
+               INSERT OR REPLACE INTO user_counters (username, unread_threads)
+                   SELECT r.username, (SELECT COUNT(*) FROM thread_receivers tr
+                                       JOIN message_threads t ON t.thread = tr.thread
+                                       WHERE tr.username = r.username AND t.last_sender != r.username)
+                   FROM (SELECT username FROM thread_receivers WHERE thread = {p}thread
+                         UNION SELECT {p}receiver) r;"""
+
+def create_counter_tables():
+    fresh = not query("SELECT name FROM sqlite_master WHERE type='table' AND name='hub_counters'")
+    query("""CREATE TABLE IF NOT EXISTS hub_counters (
+        hub TEXT PRIMARY KEY,
+        pending_shipments INTEGER DEFAULT 0,
+        low_stock_skus INTEGER DEFAULT 0,
+        units_on_hand INTEGER DEFAULT 0)""", fetch=False, commit=True)
+    query("""CREATE TABLE IF NOT EXISTS user_counters (
+        username TEXT PRIMARY KEY,
+        unread_threads INTEGER DEFAULT 0)""", fetch=False, commit=True)
+    query("""CREATE TABLE IF NOT EXISTS message_threads (
+        thread TEXT PRIMARY KEY,
+        last_sender TEXT,
+        last_at TEXT)""", fetch=False, commit=True)
+    query("""CREATE TABLE IF NOT EXISTS thread_receivers (
+        thread TEXT,
+        username TEXT,
+        PRIMARY KEY (thread, username))""", fetch=False, commit=True)
+    query("CREATE INDEX IF NOT EXISTS idx_thread_receivers_user ON thread_receivers (username)", fetch=False, commit=True)
+    query("CREATE INDEX IF NOT EXISTS idx_messages_thread ON messages (thread, timestamp)", fetch=False, commit=True)
+    stock_in = _counter_delta("NEW.hub", low=f"COALESCE(NEW.quantity, 0) < {LOW_STOCK}", units="COALESCE(NEW.quantity, 0)")
+    stock_out = _counter_delta("OLD.hub", low=f"-(COALESCE(OLD.quantity, 0) < {LOW_STOCK})", units="-COALESCE(OLD.quantity, 0)")
+    ship_in = _counter_delta("NEW.hub", pending="NEW.status = 'Pending'")
+    ship_out = _counter_delta("OLD.hub", pending="-(OLD.status = 'Pending')")
+    for name, event, body in [
+        ("trg_counters_inventory_ins", "AFTER INSERT ON inventory", stock_in),
+        ("trg_counters_inventory_del", "AFTER DELETE ON inventory", stock_out),
+        ("trg_counters_inventory_upd", "AFTER UPDATE OF quantity, hub ON inventory", stock_out + stock_in),
+        ("trg_counters_shipments_ins", "AFTER INSERT ON shipments", ship_in),
+        ("trg_counters_shipments_del", "AFTER DELETE ON shipments", ship_out),
+        ("trg_counters_shipments_upd", "AFTER UPDATE OF status, hub ON shipments", ship_out + ship_in),
+        ("trg_counters_messages_ins", "AFTER INSERT ON messages",
+         "INSERT OR IGNORE INTO thread_receivers (thread, username) VALUES (NEW.thread, NEW.receiver);"
+         + _refresh_thread_sql("NEW.")),
+        ("trg_counters_messages_del", "AFTER DELETE ON messages",
+         """DELETE FROM thread_receivers WHERE thread = OLD.thread AND username = OLD.receiver
+                AND NOT EXISTS (SELECT 1 FROM messages WHERE thread = OLD.thread AND receiver = OLD.receiver);"""
+         + _refresh_thread_sql("OLD.")),
+    ]:
+        query(f"CREATE TRIGGER IF NOT EXISTS {name} {event} BEGIN {body} END", fetch=False, commit=True)
+    if fresh:
+        rebuild_counters()
+
+# Full recompute: backfill for existing databases and repair after bulk edits
+def rebuild_counters():
+    def tx(cur):
+        for table in ["hub_counters", "user_counters", "message_threads", "thread_receivers"]:
+            cur.execute(f"DELETE FROM {table}")
+        cur.execute(f"""INSERT INTO hub_counters (hub, pending_shipments, low_stock_skus, units_on_hand)
+            SELECT hub, SUM(pending), SUM(low), SUM(units) FROM (
+                SELECT COALESCE(hub, '') AS hub, 0 AS pending, COALESCE(quantity, 0) < {LOW_STOCK} AS low,
+                       COALESCE(quantity, 0) AS units FROM inventory
+                UNION ALL
+                SELECT COALESCE(hub, ''), 1, 0, 0 FROM shipments WHERE status = 'Pending')
+            GROUP BY hub""")
+        cur.execute("""INSERT INTO message_threads (thread, last_sender, last_at)
+            SELECT thread, sender, timestamp FROM messages m WHERE id = (
+                SELECT id FROM messages WHERE thread = m.thread ORDER BY timestamp DESC, id DESC LIMIT 1)""")
+        cur.execute("INSERT OR IGNORE INTO thread_receivers (thread, username) SELECT DISTINCT thread, receiver FROM messages")
+        cur.execute("""INSERT INTO user_counters (username, unread_threads)
+            SELECT tr.username, SUM(t.last_sender != tr.username)
+            FROM thread_receivers tr JOIN message_threads t ON t.thread = tr.thread
+            GROUP BY tr.username""")
+    run_write(tx)
+
+def hub_badges(badge_hub=None):
+    if badge_hub is None:
+        row = query("SELECT SUM(pending_shipments), SUM(low_stock_skus), SUM(units_on_hand) FROM hub_counters")
+    else:
+        row = query("SELECT pending_shipments, low_stock_skus, units_on_hand FROM hub_counters WHERE hub=?", (badge_hub,))
+    return tuple(v or 0 for v in row[0]) if row else (0, 0, 0)
+
+# --- Barcode Scanning ---
+# Scans accumulate in the session as a signed total per SKU and post as one batch
+# of movements, either on Commit or automatically after N scans or T seconds.
+SCAN_FLUSH_EVERY = 50
+SCAN_FLUSH_SECONDS = 60
+
+def resolve_barcode(code):
+    row = query("""SELECT sku FROM sku_barcodes WHERE code=?
+                   UNION ALL SELECT sku FROM sku_info WHERE sku=? LIMIT 1""", (code, code))
+    return row[0][0] if row else None
+
+# Lines that fail (not enough stock) stay in the buffer so the clerk can fix them; they are
+# retried with the next auto-commit or Commit, not counted towards triggering one
+def flush_scans(scan_hub, user, comment=""):
+    buffer = st.session_state.scan_buffer
+    moves = [(sku, scan_hub, delta, comment or "Scan") for sku, delta in buffer.items() if delta]
+    applied, errors = post_movements(moves, user) if moves else ([], [])
+    st.session_state.scan_buffer = {sku: delta for sku, _, _, delta in errors}
+    st.session_state.scan_count = 0
+    st.session_state.scan_started = None
+    st.session_state.scan_result = (applied, errors)
+
+# --- Cycle Counts ---
+def start_count_session(count_hub, user):
+    def tx(cur):
+        cur.execute("INSERT INTO count_sessions (hub, username, started_at, status) VALUES (?, ?, ?, 'Open')",
+                    (count_hub, user, datetime.now().isoformat()))
+        session_id = cur.lastrowid
+        cur.execute("""INSERT INTO count_lines (session_id, sku, system_qty)
+                       SELECT ?, sku, quantity FROM inventory WHERE hub=?""", (session_id, count_hub))
+        return session_id
+    return run_write(tx)
+
+def save_count_lines(session_id, grid):
+    rows = [(None if pd.isna(c) else int(c), session_id, sku) for sku, c in zip(grid["SKU"], grid["Counted"])]
+    run_write(lambda cur: cur.executemany(
+        "UPDATE count_lines SET counted_qty=? WHERE session_id=? AND sku=?", rows))
+
+# Counted lines overwrite inventory and log the signed difference as a COUNT entry,
+# all in one transaction so the adjustments land together or not at all.
+def post_count_session(session_id, count_hub, user):
+    def tx(cur):
+        if not cur.execute("SELECT 1 FROM count_sessions WHERE id=? AND status='Open'", (session_id,)).fetchone():
+            return 0
+        now = datetime.now().isoformat()
+        cur.execute("""UPDATE count_lines SET variance = counted_qty - COALESCE(
+                           (SELECT quantity FROM inventory i WHERE i.sku=count_lines.sku AND i.hub=?), 0)
+                       WHERE session_id=? AND counted_qty IS NOT NULL""", (count_hub, session_id))
+        cur.execute("""INSERT INTO logs (timestamp, user, sku, hub, action, qty, comment)
+                       SELECT ?, ?, sku, ?, 'COUNT', variance, ?
+                       FROM count_lines WHERE session_id=? AND variance != 0""",
+                    (now, user, count_hub, f"Count {session_id}", session_id))
+        # rowcount is 0 for an INSERT into the logs view (its trigger does the work)
+        posted = cur.execute("SELECT COUNT(*) FROM count_lines WHERE session_id=? AND variance != 0",
+                             (session_id,)).fetchone()[0]
+        cur.execute("""INSERT INTO inventory (sku, hub, quantity)
+                       SELECT sku, ?, counted_qty FROM count_lines WHERE session_id=? AND variance != 0
+                       ON CONFLICT(sku, hub) DO UPDATE SET quantity=excluded.quantity""", (count_hub, session_id))
+        cur.execute("UPDATE count_sessions SET status='Posted', posted_at=?, posted_by=? WHERE id=?",
+                    (now, user, session_id))
+        cur.execute("INSERT INTO count_confirmations (username, hub, confirmed_at) VALUES (?, ?, ?)",
+                    (user, count_hub, now))
+        return posted
+    return run_write(tx)
 
 def setup_db():
     create_tables()
@@ -309,11 +995,51 @@ def setup_db():
     if not existing: seed_all_skus()
     seed_users()
 
-if not DB.exists():
-    setup_db()
-else:
-    create_tables()
-    seed_users()
+# Schema setup and migration run once per database per process. In multi-tenant mode
+# a tenant's database is migrated on its first login, and the TTT seed data is not used.
+@st.cache_resource
+def init_database(path):
+    if tenants.MULTI_TENANT:
+        create_tables()
+    elif not DB.exists():
+        setup_db()
+    else:
+        create_tables()
+        seed_users()
+
+# --- Tenant Routing ---
+# Every query() without an explicit path goes to the session's database
+active_db = tenants.tenant_path(st.session_state.get("tenant")) if tenants.MULTI_TENANT else DB
+set_current(active_db)
+if active_db:
+    init_database(str(active_db))
+elif "user" in st.session_state:
+    del st.session_state.user  # the tenant was removed; never fall back to another database
+
+@st.cache_resource
+def start_maintenance_scheduler():
+    return maintenance.start_scheduler() if maintenance.SCHEDULER_ENABLED else None
+
+start_maintenance_scheduler()
+
+@st.cache_resource
+def start_notifier():
+    return notifier.start_dispatcher() if notifier.DISPATCHER_ENABLED else None
+
+start_notifier()
+
+# Export files are only built when someone asks for one, then served from the
+# version-keyed cache until the underlying tables change.
+def export_download(label, name, params, tables, build, file_name, key, disk=True):
+    c1, c2 = st.columns([1, 3])
+    compress = c1.checkbox("gzip", key=f"{key}_gzip")
+    data = exports.peek(name, params, tables, compress, disk=disk)
+    if data is None:
+        if not c2.button(f"⚙️ {T('prepare_export')} {file_name}", key=f"{key}_prepare"):
+            return
+        data = exports.get_artifact(name, params, tables, build, compress, disk=disk)
+    c2.download_button(label, data, file_name + (".gz" if compress else ""),
+                       "application/gzip" if compress else "text/csv", key=key)
 
 def login(username, password):
     hashed = hashlib.sha256(password.encode()).hexdigest()
@@ -324,26 +1050,27 @@ def login(username, password):
     return user[0] if user else None
 
 def count_unread(username):
-    threads = query("SELECT DISTINCT thread FROM messages WHERE receiver=?", (username,))
-    unread = 0
-    for t in threads:
-        last_msg = query(
-            "SELECT sender FROM messages WHERE thread=? ORDER BY timestamp DESC LIMIT 1",
-            (t[0],)
-        )
-        if last_msg and last_msg[0][0] != username:
-            unread += 1
-    return unread
+    row = query("SELECT unread_threads FROM user_counters WHERE username=?", (username,))
+    return row[0][0] if row else 0
 
 # --- Login Screen ---
 if "user" not in st.session_state:
     st.sidebar.title("🔐 Login")
+    if tenants.MULTI_TENANT:
+        tenant = st.sidebar.text_input("Business", key="login_tenant").strip().lower()
     u = st.sidebar.text_input("Username", key="login_user")
     p = st.sidebar.text_input("Password", type="password", key="login_pw")
     if st.sidebar.button("Login", key="login_btn"):
-        user = login(u, p)
+        if tenants.MULTI_TENANT:
+            active_db = tenants.tenant_path(tenant)
+            set_current(active_db)
+            if active_db:
+                init_database(str(active_db))
+        user = login(u, p) if active_db else None
         if user:
             st.session_state.user = user
+            if tenants.MULTI_TENANT:
+                st.session_state.tenant = tenant
             st.rerun()
         else:
             st.sidebar.error("Invalid credentials")
@@ -351,25 +1078,45 @@ if "user" not in st.session_state:
 
 username, role, hub = st.session_state.user
 unread = count_unread(username)
-st.sidebar.success(f"Welcome, {username} ({role})")
+st.sidebar.success(f"Welcome, {username} ({role})" + (f" — {st.session_state.tenant}" if tenants.MULTI_TENANT else ""))
 st.sidebar.markdown(f"📨 **Unread Threads: {unread}**")
+if role != "Supplier":
+    pending, low, units = hub_badges(None if role == "Admin" else hub)
+    badges = [f"🟥 Low Stock: **{low}**", f"📦 On Hand: **{units}**"]
+    if role in ["Admin", "Hub Manager"]:
+        badges.insert(0, f"🚚 Pending Shipments: **{pending}**")
+    st.sidebar.markdown("  \n".join(badges))
 if st.sidebar.button("🚪 Logout", key=f"logout_btn_{username}"):
     del st.session_state.user
+    st.session_state.pop("tenant", None)
     st.rerun()
 
+# --- Global Search ---
+if search_available():
+    search_text = st.sidebar.text_input("🔎 Search", placeholder="SKU, tracking, message…", key="global_search")
+    if search_text.strip():
+        results = search_all(search_text, username, role, hub)
+        with st.expander(f"🔎 {len(results)} results for '{search_text.strip()}'", expanded=True):
+            if not results:
+                st.info("No matches.")
+            for kind, title, snip, detail in results:
+                # Everything but the kind is user-entered text: escape it before allowing HTML
+                title, snip, detail = (html.escape(str(x)) for x in (title or "—", snip, detail))
+                st.markdown(f"`{kind}` **{title}** — {snip}  \n<small>{detail}</small>", unsafe_allow_html=True)
+
 # --- Define ALL menus and logic exactly as in your latest working code, using unique keys for every Streamlit element. ---
 
 menus = {
     "Admin": [
-        "Inventory", "Logs", "Shipments", "Messages", "Count", "Assign SKUs",
+        "Inventory", "Logs", "Dashboard", "Shipments", "Messages", "Count", "Assign SKUs",
         "Create SKU", "Upload SKUs", "User Access", "Create User",
-        "Backup", "Restore", "Google Sheets"
+        "Transfers", "Backup", "Restore", "Maintenance", "Reconcile", "Google Sheets"
     ],
     "Hub Manager": [
-        "Inventory", "Update Stock", "Bulk Update", "Messages", "Count", "Incoming Shipments", "Google Sheets"
+        "Inventory", "Update Stock", "Bulk Update", "Scan", "Transfers", "Messages", "Count", "Incoming Shipments", "Dashboard", "Google Sheets"
     ],
     "Retail": [
-        "Inventory", "Update Stock", "Bulk Update", "Messages", "Count", "Google Sheets"
+        "Inventory", "Update Stock", "Bulk Update", "Scan", "Transfers", "Messages", "Count", "Dashboard", "Google Sheets"
     ],
     "Supplier": [
         "Shipments"
@@ -387,7 +1134,7 @@ if menu == "User Access" and role == "Admin":
     st.dataframe(df_users, use_container_width=True, key="user_access_df")
 
     st.subheader(T("remove_user"))
-    user_list = [u[0] for u in query("SELECT username FROM users WHERE username != ?", (username,))]
+    user_list = [u[0] for u in query("SELECT username FROM users WHERE username != ? AND role != 'System'", (username,))]
     selected_user = st.selectbox(T("select_user"), user_list, key="remove_user_select")
     if st.button(T("remove_user"), key="btn_remove_user"):
         st.session_state['confirm_remove_user'] = selected_user
@@ -403,7 +1150,8 @@ if menu == "User Access" and role == "Admin":
 if menu == "Create SKU" and role == "Admin":
     st.header(T("create_new_sku"))
     new_sku = st.text_input(T("new_sku_name"), key="create_sku_name")
-    hubs = st.multiselect(T("assign_to_hubs"), ["Hub 1", "Hub 2", "Hub 3", "Retail"], key="create_sku_hubs")
+    hubs = st.multiselect(T("assign_to_hubs"), tenants.hub_names(), key="create_sku_hubs")
+    barcode = st.text_input(T("barcode"), key="create_sku_barcode")
     if st.button(T("create_sku"), key="btn_create_sku"):
         if not new_sku.strip():
             st.warning(T("enter_sku_name"))
@@ -428,6 +1176,9 @@ if menu == "Create SKU" and role == "Admin":
                         fetch=False,
                         commit=True
                     )
+                if barcode.strip():
+                    query("INSERT OR REPLACE INTO sku_barcodes (code, sku) VALUES (?, ?)",
+                          (barcode.strip(), new_sku.strip()), fetch=False, commit=True)
                 st.success(f"✅ SKU '{new_sku}' created and assigned!")
                 st.rerun()
 
@@ -437,15 +1188,16 @@ if menu == "Upload SKUs" and role == "Admin":
     uploaded_file = st.file_uploader(T("upload_csv"), type="csv", key="upload_sku_file")
     if uploaded_file is not None:
         try:
-            df = pd.read_csv(uploaded_file)
+            df = pd.read_csv(uploaded_file, dtype={"barcode": str})
             if df.empty:
                 st.warning("CSV is empty.")
             else:
                 inserted_count = 0
+                default_hubs = ",".join(tenants.hub_names("Retail"))
                 for _, row in df.iterrows():
                     sku = str(row['sku']).strip()
                     product_name = str(row.get('product_name', sku)).strip()
-                    assigned_hubs = str(row.get('assigned_hubs', 'Retail')).strip()
+                    assigned_hubs = str(row.get('assigned_hubs', default_hubs)).strip()
                     if sku:
                         query(
                             "INSERT OR IGNORE INTO sku_info (sku, product_name, assigned_hubs) VALUES (?, ?, ?)",
@@ -460,6 +1212,10 @@ if menu == "Upload SKUs" and role == "Admin":
                                 fetch=False,
                                 commit=True
                             )
+                        barcode = row.get('barcode')
+                        if pd.notna(barcode) and str(barcode).strip():
+                            query("INSERT OR REPLACE INTO sku_barcodes (code, sku) VALUES (?, ?)",
+                                  (str(barcode).strip(), sku), fetch=False, commit=True)
                         inserted_count += 1
                 st.success(f"Uploaded {inserted_count} SKUs!")
                 st.rerun()
@@ -471,7 +1227,7 @@ if menu == "Assign SKUs" and role == "Admin":
     st.header(T("assign_skus"))
     skus = [s[0] for s in query("SELECT sku FROM sku_info")]
     sku_choice = st.selectbox(T("select_sku_assign"), skus, key="assign_sku_select")
-    hubs = ["Hub 1", "Hub 2", "Hub 3", "Retail"]
+    hubs = tenants.hub_names()
     assigned = query("SELECT assigned_hubs FROM sku_info WHERE sku=?", (sku_choice,))
     current = assigned[0][0].split(",") if assigned and assigned[0][0] else []
     new_hubs = st.multiselect(T("assign_to_hubs"), hubs, default=current, key="assign_hubs_multiselect")
@@ -494,10 +1250,9 @@ if menu == "Create User" and role == "Admin":
     new_username = st.text_input(T("username"), key="create_user_name")
     new_password = st.text_input(T("password"), type="password", key="create_user_pw")
     new_role = st.selectbox(T("role"), ["Admin", "Hub Manager", "Retail", "Supplier"], key="create_user_role")
-    if new_role == "Hub Manager":
-        new_hub = st.selectbox(T("hub"), ["Hub 1", "Hub 2", "Hub 3"], key="create_user_hub")
-    elif new_role == "Retail":
-        new_hub = "Retail"
+    if new_role in ["Hub Manager", "Retail"]:
+        new_hub = st.selectbox(T("hub"), tenants.hub_names("Hub" if new_role == "Hub Manager" else "Retail"),
+                               key="create_user_hub")
     else:
         new_hub = ""
     if st.button(T("create_user"), key="btn_create_user"):
@@ -524,17 +1279,15 @@ if menu == "Backup" and role == "Admin":
     st.write("Download CSV backups for all main tables.")
     tables = ["users", "inventory", "logs", "sku_info", "shipments", "messages", "count_confirmations"]
     for table in tables:
-        rows = query(f"SELECT * FROM {table}")
-        if not rows:
+        if not query(f"SELECT 1 FROM {table} LIMIT 1"):
             st.info(f"No data in table '{table}' to backup.")
             continue
-        cols_info = query(f"PRAGMA table_info({table})", fetch=True)
-        columns = [col[1] for col in cols_info]
-        df = pd.DataFrame(rows, columns=columns)
-        csv_buffer = io.StringIO()
-        df.to_csv(csv_buffer, index=False)
-        csv_data = csv_buffer.getvalue()
-        st.download_button(f"{T('download_backup')} '{table}'", csv_data, file_name=f"{table}_backup.csv", mime="text/csv", key=f"download_{table}")
+        def build_backup(table=table):
+            cols_info = query(f"PRAGMA table_info({table})", fetch=True)
+            df = pd.DataFrame(query(f"SELECT * FROM {table}"), columns=[col[1] for col in cols_info])
+            return df.to_csv(index=False).encode()
+        export_download(f"{T('download_backup')} '{table}'", "backup", (table,), (table,), build_backup,
+                        f"{table}_backup.csv", f"download_{table}", disk=False)
 
 # --- Restore ---
 if menu == "Restore" and role == "Admin":
@@ -570,6 +1323,56 @@ if menu == "Restore" and role == "Admin":
                 except Exception as e:
                     st.error(f"Error restoring table '{tbl}': {e}")
 
+# --- Maintenance ---
+if menu == "Maintenance" and role == "Admin":
+    st.header(T("maintenance"))
+    st.write(f"Scheduled runs happen once a day between {maintenance.OFF_PEAK_HOURS.start}:00 and "
+             f"{maintenance.OFF_PEAK_HOURS.stop}:00. Soft-deleted shipments and cancelled counts older "
+             f"than the retention window are purged.")
+    tasks = st.multiselect("Tasks", maintenance.TASKS, default=maintenance.TASKS, key="maint_tasks")
+    retention = st.number_input("Retention (days)", min_value=0, value=maintenance.RETENTION_DAYS, step=1, key="maint_retention")
+    if st.button(T("run_maintenance"), key="btn_run_maintenance", disabled=not tasks):
+        with st.spinner("Running maintenance…"):
+            result = maintenance.run_maintenance(tasks, int(retention), trigger=f"manual:{username}")
+        msg = f"Size {result['size_before'] / 1e6:.2f} MB → {result['size_after'] / 1e6:.2f} MB"
+        (st.success if result["status"] == "OK" else st.error)(f"{result['status']} — {msg}")
+        st.json(result["details"])
+    runs = query("""SELECT id, started_at, finished_at, trigger, status, size_before, size_after, details
+                    FROM maintenance_runs ORDER BY id DESC LIMIT 50""")
+    df_runs = pd.DataFrame(runs, columns=["ID", "Started", "Finished", "Trigger", "Status", "Size Before", "Size After", "Details"])
+    st.subheader("Recent Runs")
+    st.dataframe(df_runs, use_container_width=True, key="maintenance_runs_df")
+
+# --- Reconcile ---
+if menu == "Reconcile" and role == "Admin":
+    st.header(T("reconcile"))
+    st.write("Replays the logs ledger from the latest checkpoint and compares it with inventory. "
+             "Corrections are posted as COUNT entries so the ledger matches the shelf quantities.")
+    c1, c2, c3 = st.columns(3)
+    result = None
+    if c1.button(T("run_reconcile"), key="btn_run_reconcile"):
+        with st.spinner("Replaying ledger…"):
+            result = reconcile.reconcile(trigger=f"manual:{username}")
+    if c2.button(T("post_corrections"), key="btn_post_corrections"):
+        with st.spinner("Replaying ledger…"):
+            result = reconcile.reconcile(fix=True, user=username, trigger=f"manual:{username}")
+    accept = st.checkbox("Checkpoint from current inventory (opening balance)", key="reconcile_accept_inventory")
+    if c3.button(T("create_checkpoint"), key="btn_create_checkpoint"):
+        cp = reconcile.create_checkpoint(accept_inventory=accept, note=f"by {username}")
+        st.success(f"📌 Checkpoint {cp} saved.")
+    if result:
+        msg = f"{result['log_rows']} log rows in {result['seconds']}s · {len(result['discrepancies'])} discrepancies"
+        (st.success if result["discrepancies"].empty else st.warning)(
+            msg + (f" · {result['corrected']} corrected" if result["corrected"] else ""))
+        if result["unknown_actions"]:
+            st.info(f"Ignored actions: {', '.join(result['unknown_actions'])}")
+        st.dataframe(result["discrepancies"], use_container_width=True, hide_index=True, key="reconcile_diff_df")
+    runs = query("""SELECT id, started_at, trigger, checkpoint_id, log_rows, discrepancies, corrected, seconds
+                    FROM reconciliation_runs ORDER BY id DESC LIMIT 50""")
+    st.subheader("Recent Runs")
+    st.dataframe(pd.DataFrame(runs, columns=["ID", "Started", "Trigger", "Checkpoint", "Log Rows", "Discrepancies", "Corrected", "Seconds"]),
+                 use_container_width=True, key="reconcile_runs_df")
+
 # (Other menus—Inventory, Update Stock, Bulk Update, Logs, Messages, etc.—remain as in the original script above, and use unique keys on every Streamlit element.)
 
 # --- Inventory ---
@@ -580,14 +1383,13 @@ if menu == "Inventory":
     else:
         rows = query("SELECT sku, hub, quantity FROM inventory WHERE hub=?", (hub,))
     df = pd.DataFrame(rows, columns=[T("sku"), T("hub"), T("qty")])
-    df['Status'] = df[T("qty")].apply(lambda x: "🟥 Low" if x < 10 else "✅ OK")
+    df['Status'] = df[T("qty")].apply(lambda x: "🟥 Low" if x < LOW_STOCK else "✅ OK")
     sku_filter = st.text_input(T("select_sku"), key="filter_by_sku")
     if sku_filter:
         df = df[df[T("sku")].str.contains(sku_filter, case=False)]
     st.dataframe(df, use_container_width=True, key="inventory_df")
-    buff = io.StringIO()
-    df.to_csv(buff, index=False)
-    st.download_button(T("export_inventory"), buff.getvalue(), "inventory.csv", "text/csv", key="export_inventory_btn")
+    export_download(T("export_inventory"), "inventory", (role == "Admin" or hub, sku_filter, st.session_state["lang"]),
+                    ("inventory",), lambda: df.to_csv(index=False).encode(), "inventory.csv", "export_inventory_btn")
 
 # --- Update Stock ---
 if menu == "Update Stock":
@@ -599,25 +1401,11 @@ if menu == "Update Stock":
     qty = st.number_input(T("quantity"), min_value=1, step=1, key="update_qty")
     comment = st.text_input(T("optional_comment"), key="update_comment")
     if st.button(T("submit_update"), key="btn_update_stock"):
-        record = query("SELECT quantity FROM inventory WHERE sku=? AND hub=?", (sku, hub))
-        current = record[0][0] if record else 0
-        if action == "OUT" and qty > current:
+        applied, errors = post_movements([(sku, hub, qty if action == "IN" else -qty, comment)], username)
+        if errors:
             st.warning("❌ Not enough stock to remove that amount!")
         else:
-            new_qty = current + qty if action == "IN" else current - qty
-            query(
-                """INSERT INTO inventory (sku, hub, quantity) VALUES (?, ?, ?)
-                   ON CONFLICT(sku, hub) DO UPDATE SET quantity=excluded.quantity""",
-                (sku, hub, new_qty),
-                fetch=False,
-                commit=True
-            )
-            query(
-                "INSERT INTO logs VALUES (?, ?, ?, ?, ?, ?, ?)",
-                (datetime.now().isoformat(), username, sku, hub, action, qty, comment),
-                fetch=False,
-                commit=True
-            )
+            new_qty = applied[0][3]
             st.success(
                 f"✅ Inventory updated!  \n**SKU:** {sku}  \n**Hub:** {hub}  \n**Action:** {action}  \n**Qty:** {qty}  \n**New Qty:** {new_qty}"
             )
@@ -654,6 +1442,7 @@ if menu == "Bulk Update":
         results = []
         big_change = False
         any_change = False
+        moves = []
         for sku, adj, comment in update_data:
             try:
                 n = int(adj.strip()) if adj.strip() else 0
@@ -664,27 +1453,13 @@ if menu == "Bulk Update":
             any_change = True
             if abs(n) >= 10:
                 big_change = True
-            record = query("SELECT quantity FROM inventory WHERE sku=? AND hub=?", (sku, hub))
-            current = record[0][0] if record else 0
-            new_qty = current + n
-            if new_qty < 0:
+            moves.append((sku, hub, n, comment))
+        if moves:
+            applied, failed = post_movements(moves, username)
+            for sku, _, n, current in failed:
                 errors.append(f"❌ Not enough '{sku}' (Now: {current}, Tried: {n})")
-                continue
-            action = "IN" if n > 0 else "OUT"
-            query(
-                """INSERT INTO inventory (sku, hub, quantity) VALUES (?, ?, ?)
-                   ON CONFLICT(sku, hub) DO UPDATE SET quantity=excluded.quantity""",
-                (sku, hub, new_qty),
-                fetch=False,
-                commit=True
-            )
-            query(
-                "INSERT INTO logs VALUES (?, ?, ?, ?, ?, ?, ?)",
-                (datetime.now().isoformat(), username, sku, hub, action, abs(n), comment),
-                fetch=False,
-                commit=True
-            )
-            results.append(f"{sku}: {action} {abs(n)} (Now: {new_qty})")
+            for sku, _, n, new_qty in applied:
+                results.append(f"{sku}: {'IN' if n > 0 else 'OUT'} {abs(n)} (Now: {new_qty})")
 
         if not any_change:
             st.info("No changes submitted.")
@@ -693,7 +1468,7 @@ if menu == "Bulk Update":
                 st.warning("Some updates failed:\n" + "\n".join(errors))
             if results:
                 st.success("✅ Bulk update complete!\n\n" + "\n".join(results))
-                logs = query("SELECT timestamp, sku, action, qty, comment FROM logs WHERE hub=? ORDER BY timestamp DESC LIMIT 3", (hub,))
+                logs = query("SELECT timestamp, sku, action, qty, comment FROM log_rows WHERE hub=? ORDER BY ts DESC LIMIT 3", (hub,))
                 if logs:
                     st.markdown("#### Last 3 Inventory Actions:")
                     st.table(pd.DataFrame(logs, columns=["Time", "SKU", "Action", "Qty", "Comment"]))
@@ -701,40 +1476,255 @@ if menu == "Bulk Update":
                 st.balloons()
         st.rerun()
 
+# --- Scan Mode ---
+if menu == "Scan" and role in ["Hub Manager", "Retail"]:
+    st.header(T("scan_mode"))
+    for k, v in [("scan_buffer", {}), ("scan_count", 0), ("scan_started", None), ("scan_result", None), ("scan_note", "")]:
+        st.session_state.setdefault(k, v)
+    hub_skus = {o[0] for o in query("SELECT sku FROM sku_info WHERE assigned_hubs LIKE ?", (f"%{hub}%",))}
+    action = st.radio(T("action"), ["IN", "OUT"], horizontal=True, key="scan_action_radio")
+    comment = st.text_input(T("optional_comment"), key="scan_comment")
+
+    # Keyboard-wedge scanners type the code and press Enter; the field clears itself for the next scan
+    def on_scan():
+        set_current(active_db)  # callbacks run before the script body, so route them too
+        code = st.session_state.scan_code.strip()
+        st.session_state.scan_code = ""
+        if not code:
+            return
+        sku = resolve_barcode(code)
+        if sku is None or sku not in hub_skus:
+            st.session_state.scan_note = f"❌ Unknown code for {hub}: {code}"
+            return
+        buffer = st.session_state.scan_buffer
+        buffer[sku] = buffer.get(sku, 0) + (1 if action == "IN" else -1)
+        st.session_state.scan_count += 1
+        st.session_state.scan_started = st.session_state.scan_started or time.time()
+        st.session_state.scan_note = f"✅ {sku} ({buffer[sku]:+d})"
+        if st.session_state.scan_count >= SCAN_FLUSH_EVERY:
+            flush_scans(hub, username, comment)
+
+    st.text_input(T("scan_code"), key="scan_code", on_change=on_scan)
+    started = st.session_state.scan_started
+    if st.session_state.scan_buffer and started and time.time() - started >= SCAN_FLUSH_SECONDS:
+        flush_scans(hub, username, comment)
+    if st.session_state.scan_note:
+        st.caption(st.session_state.scan_note)
+
+    if st.session_state.scan_result:
+        applied, errors = st.session_state.scan_result
+        if applied:
+            st.success("✅ Posted: " + ", ".join(f"{sku} {n:+d} (Now: {q})" for sku, _, n, q in applied))
+        for sku, _, current, n in errors:
+            st.warning(f"❌ Not enough '{sku}' (Now: {current}, Tried: {n})")
+
+    buffer = st.session_state.scan_buffer
+    st.write(f"{st.session_state.scan_count} scans pending · {len(buffer)} SKUs "
+             f"(auto-commit at {SCAN_FLUSH_EVERY} scans or {SCAN_FLUSH_SECONDS}s)")
+    if buffer:
+        st.dataframe(pd.DataFrame(sorted(buffer.items()), columns=[T("sku"), T("qty")]),
+                     use_container_width=True, hide_index=True, key="scan_buffer_df")
+    c1, c2 = st.columns(2)
+    if c1.button(T("commit_scans"), key="btn_commit_scans", disabled=not buffer):
+        flush_scans(hub, username, comment)
+        st.rerun()
+    if c2.button(T("clear_scans"), key="btn_clear_scans", disabled=not buffer):
+        st.session_state.scan_buffer, st.session_state.scan_count, st.session_state.scan_started = {}, 0, None
+        st.rerun()
+
+# --- Transfers ---
+if menu == "Transfers" and role in ["Admin", "Hub Manager", "Retail"]:
+    st.header(T("transfers"))
+    all_hubs = tenants.hub_names()
+    st.subheader(T("create_transfer"))
+    c1, c2 = st.columns(2)
+    if role == "Admin":
+        from_hub = c1.selectbox(T("from_hub"), all_hubs, key="transfer_from")
+    else:
+        from_hub = hub
+        c1.markdown(f"**{T('from_hub')}:** {hub}")
+    to_hub = c2.selectbox(T("to_hub"), [h for h in all_hubs if h != from_hub], key="transfer_to")
+    stock = query("SELECT sku, quantity FROM inventory WHERE hub=? AND quantity > 0 ORDER BY sku", (from_hub,))
+    grid = pd.DataFrame(stock, columns=["SKU", "Available"]).assign(Transfer=0)
+    edited = st.data_editor(
+        grid,
+        column_config={"Transfer": st.column_config.NumberColumn("Transfer", min_value=0, step=1)},
+        disabled=["SKU", "Available"],
+        hide_index=True,
+        use_container_width=True,
+        key=f"transfer_grid_{from_hub}"
+    )
+    note = st.text_input(T("optional_comment"), key="transfer_note")
+    picked = edited[pd.to_numeric(edited["Transfer"], errors="coerce").fillna(0) > 0]
+    st.write(f"{len(picked)} SKUs · {int(picked['Transfer'].sum()) if len(picked) else 0} units")
+    if st.button(T("create_transfer"), key="btn_create_transfer", disabled=picked.empty):
+        transfer_id, short = create_transfer(from_hub, to_hub, zip(picked["SKU"], picked["Transfer"].astype(int)), username, note)
+        if short:
+            st.warning("❌ Not enough stock:\n" + "\n".join(f"{sku} (Now: {have}, Tried: {want})" for sku, have, want in short))
+        else:
+            st.success(f"✅ Transfer {transfer_id} sent: {len(picked)} SKUs to {to_hub}.")
+            st.rerun()
+
+    st.subheader(T("in_transit"))
+    if role == "Admin":
+        open_transfers = query("SELECT id, from_hub, to_hub, created_by, created_at, note FROM transfers WHERE status='In Transit' ORDER BY id")
+    else:
+        open_transfers = query("""SELECT id, from_hub, to_hub, created_by, created_at, note FROM transfers
+                                  WHERE status='In Transit' AND (from_hub=? OR to_hub=?) ORDER BY id""", (hub, hub))
+    if not open_transfers:
+        st.info("No transfers in transit.")
+    for transfer_id, t_from, t_to, t_by, t_at, t_note in open_transfers:
+        lines = query("SELECT sku, qty FROM transfer_lines WHERE transfer_id=? ORDER BY sku", (transfer_id,))
+        with st.expander(f"Transfer {transfer_id}: {t_from} → {t_to} · {len(lines)} SKUs · {sum(q for _, q in lines)} units"):
+            st.caption(f"Sent by {t_by} at {t_at}" + (f" — {t_note}" if t_note else ""))
+            st.dataframe(pd.DataFrame(lines, columns=["SKU", "Qty"]), use_container_width=True, hide_index=True,
+                         key=f"transfer_lines_{transfer_id}")
+            c1, c2 = st.columns(2)
+            if (role == "Admin" or hub == t_to) and c1.button(T("receive_transfer"), key=f"btn_receive_transfer_{transfer_id}"):
+                if close_transfer(transfer_id, username):
+                    st.success(f"✅ Transfer {transfer_id} received at {t_to}.")
+                st.rerun()
+            if (role == "Admin" or hub == t_from) and c2.button(T("cancel_transfer"), key=f"btn_cancel_transfer_{transfer_id}"):
+                if close_transfer(transfer_id, username, receive=False):
+                    st.success(f"↩️ Transfer {transfer_id} cancelled; stock returned to {t_from}.")
+                st.rerun()
+
 # --- Logs ---
 if menu == "Logs":
     st.header(T("activity_logs"))
-    logs = query("SELECT * FROM logs ORDER BY timestamp DESC")
+    logs = query("SELECT timestamp, user, sku, hub, action, qty, comment FROM log_rows ORDER BY ts DESC")
     df = pd.DataFrame(logs, columns=["Time", "User", "SKU", "Hub", "Action", "Qty", "Comment"])
     search = st.text_input(T("filter_logs"), placeholder="Type keyword, SKU, user, action...", key="log_search")
     if search:
         df = df[df.apply(lambda row: search.lower() in row.astype(str).str.lower().to_string(), axis=1)]
     st.dataframe(df, use_container_width=True, key="logs_df")
-    buff = io.BytesIO()
-    df.to_csv(buff, index=False)
-    st.download_button("📥 Download CSV of Logs", buff.getvalue(), "logs.csv", "text/csv", key="download_logs_btn")
+    export_download("📥 Download CSV of Logs", "logs", (search,), ("logs",),
+                    lambda: df.to_csv(index=False).encode(), "logs.csv", "download_logs_btn")
+
+# --- Operations Dashboard ---
+if menu == "Dashboard":
+    st.header(T("ops_dashboard"))
+    hub_clause, hub_params = ("", ()) if role == "Admin" else (" AND hub=?", (hub,))
+    since = st.date_input("Since", value=datetime.today() - timedelta(days=30), key="dash_since")
+    since = str(since)
+
+    daily = query(f"SELECT day, hub, units_in, units_out FROM throughput_daily WHERE day >= ?{hub_clause} ORDER BY day",
+                  (since,) + hub_params)
+    df_daily = pd.DataFrame(daily, columns=["Day", "Hub", "IN", "OUT"])
+    c1, c2, c3 = st.columns(3)
+    c1.metric("Units IN", int(df_daily["IN"].sum()))
+    c2.metric("Units OUT", int(df_daily["OUT"].sum()))
+    c3.metric("Net", int(df_daily["IN"].sum() - df_daily["OUT"].sum()))
+
+    st.subheader(T("units_per_day"))
+    if df_daily.empty:
+        st.info("No stock movements in this period.")
+    else:
+        chart = df_daily.assign(Units=df_daily["IN"] + df_daily["OUT"]).pivot_table(
+            index="Day", columns="Hub", values="Units", aggfunc="sum", fill_value=0)
+        st.bar_chart(chart)
+        st.dataframe(df_daily, use_container_width=True, key="dash_daily_df")
+
+    st.subheader(T("units_per_week"))
+    weekly = query(f"""SELECT strftime('%Y-W%W', day) AS week, hub, SUM(units_in), SUM(units_out)
+                       FROM throughput_daily WHERE day >= ?{hub_clause} GROUP BY week, hub ORDER BY week DESC, hub""",
+                   (since,) + hub_params)
+    st.dataframe(pd.DataFrame(weekly, columns=["Week", "Hub", "IN", "OUT"]), use_container_width=True, key="dash_weekly_df")
+
+    st.subheader(T("lead_times"))
+    leads = query(f"""SELECT hub, COUNT(*), ROUND(AVG(lead_days), 2), MIN(lead_days), MAX(lead_days)
+                      FROM shipment_lead_times WHERE received >= ?{hub_clause} GROUP BY hub ORDER BY hub""",
+                  (since,) + hub_params)
+    st.dataframe(pd.DataFrame(leads, columns=["Hub", "Shipments", "Avg", "Min", "Max"]),
+                 use_container_width=True, key="dash_leads_df")
+
+    st.subheader(T("top_movers"))
+    movers = query(f"""SELECT sku, hub, SUM(units_in), SUM(units_out), SUM(units_in + units_out) AS moved
+                       FROM sku_daily WHERE day >= ?{hub_clause} GROUP BY sku, hub ORDER BY moved DESC LIMIT 15""",
+                   (since,) + hub_params)
+    st.dataframe(pd.DataFrame(movers, columns=[T("sku"), T("hub"), "IN", "OUT", "Total"]),
+                 use_container_width=True, key="dash_movers_df")
+
+    if role == "Admin":
+        st.subheader("🔒 Write Lock Metrics (this worker)")
+        lm = lock_metrics.snapshot()
+        m1, m2, m3, m4 = st.columns(4)
+        m1.metric("Writes", lm["writes"])
+        m2.metric("Retries / Failures", f"{lm['retries']} / {lm['failures']}")
+        m3.metric("p95 wait (ms)", f"{lm['p95_wait_ms']:.1f}")
+        m4.metric("Max wait (ms)", f"{lm['max_wait_ms']:.1f}")
+        if st.button(T("rebuild_aggregates"), key="btn_rebuild_aggregates"):
+            rebuild_throughput()
+            rebuild_counters()
+            st.success("✅ Aggregates rebuilt from logs.")
+            st.rerun()
 
 # --- Count Mode ---
 if menu == "Count":
     st.header(T("inventory_count_mode"))
-    q = "SELECT sku, hub, quantity FROM inventory"
-    f = ()
-    if role != "Admin":
-        q += " WHERE hub=?"
-        f = (hub,)
-    data = query(q, f)
-    df = pd.DataFrame(data, columns=[T("sku"), T("hub"), T("qty")])
-    df['Status'] = df[T("qty")].apply(lambda x: "🟥 Low" if x < 10 else "✅ OK")
-    st.dataframe(df, use_container_width=True, key="count_df")
-    if role != "Admin":
-        if st.button(T("count_confirmed"), key="btn_count_confirm"):
-            query("INSERT INTO count_confirmations (username, hub, confirmed_at) VALUES (?, ?, ?)",
-                  (username, hub, datetime.now().isoformat()), fetch=False, commit=True)
-            st.success(T("count_confirmed"))
-            st.info(T("refresh"))
+    if role == "Admin":
+        data = query("SELECT sku, hub, quantity FROM inventory")
+        df = pd.DataFrame(data, columns=[T("sku"), T("hub"), T("qty")])
+        df['Status'] = df[T("qty")].apply(lambda x: "🟥 Low" if x < LOW_STOCK else "✅ OK")
+        st.dataframe(df, use_container_width=True, key="count_df")
+    else:
+        session = query("SELECT id, username, started_at FROM count_sessions WHERE hub=? AND status='Open' ORDER BY id DESC LIMIT 1", (hub,))
+        if not session:
+            if "count_posted" in st.session_state:  # shown once, after the rerun that follows posting
+                st.success(f"✅ Count posted: {st.session_state.pop('count_posted')} adjustments.")
+            st.info("No count in progress for your hub.")
+            if st.button(T("start_count"), key="btn_start_count"):
+                start_count_session(hub, username)
+                st.rerun()
+        else:
+            session_id, started_by, started_at = session[0]
+            st.caption(f"Count #{session_id} started by {started_by} at {started_at}")
+            lines = query("SELECT sku, system_qty, counted_qty FROM count_lines WHERE session_id=? ORDER BY sku", (session_id,))
+            grid = pd.DataFrame(lines, columns=["SKU", "System", "Counted"])
+            edited = st.data_editor(
+                grid,
+                column_config={"Counted": st.column_config.NumberColumn("Counted", min_value=0, step=1)},
+                disabled=["SKU", "System"],
+                hide_index=True,
+                use_container_width=True,
+                key=f"count_grid_{session_id}"
+            )
+            # Variance against live inventory in one vectorized pass
+            live = pd.DataFrame(query("SELECT sku, quantity FROM inventory WHERE hub=?", (hub,)), columns=["SKU", "Current"])
+            counted = edited.assign(Counted=pd.to_numeric(edited["Counted"], errors="coerce"))
+            var = counted.merge(live, on="SKU", how="left").fillna({"Current": 0})
+            var = var[var["Counted"].notna()]
+            var["Variance"] = (var["Counted"] - var["Current"]).astype(int)
+            st.write(f"Counted {len(var)} of {len(counted)} SKUs · {int((var['Variance'] != 0).sum())} with variance")
+            st.subheader(T("variance"))
+            st.dataframe(var[var["Variance"] != 0][["SKU", "Current", "Counted", "Variance"]],
+                         use_container_width=True, key="count_variance_df")
+            c1, c2, c3 = st.columns(3)
+            if c1.button(T("save_count"), key="btn_save_count"):
+                save_count_lines(session_id, counted)
+                st.success("✅ Count progress saved.")
+            if c2.button(T("post_count"), key="btn_post_count"):
+                save_count_lines(session_id, counted)
+                st.session_state.count_posted = post_count_session(session_id, hub, username)
+                st.rerun()
+            if c3.button(T("cancel_count"), key="btn_cancel_count"):
+                query("UPDATE count_sessions SET status='Cancelled' WHERE id=? AND status='Open'", (session_id,), fetch=False, commit=True)
+                st.rerun()
         if st.button(T("refresh"), key="btn_refresh_count"):
             st.rerun()
     if role == "Admin":
+        st.subheader(T("count_sessions"))
+        sessions = query("""SELECT s.id, s.hub, s.username, s.started_at, s.status, s.posted_at, s.posted_by,
+                                   COUNT(l.counted_qty), SUM(CASE WHEN l.variance != 0 THEN 1 ELSE 0 END)
+                            FROM count_sessions s LEFT JOIN count_lines l ON l.session_id = s.id
+                            GROUP BY s.id ORDER BY s.id DESC""")
+        df_sessions = pd.DataFrame(sessions, columns=["ID", T("hub"), T("username"), "Started", "Status", "Posted", "Posted By", "Counted", "Variances"])
+        st.dataframe(df_sessions, use_container_width=True, key="count_sessions_df")
+        if not df_sessions.empty:
+            audit_id = st.selectbox("Audit Count", df_sessions["ID"].tolist(), key="count_audit_select")
+            audit = query("SELECT sku, system_qty, counted_qty, variance FROM count_lines WHERE session_id=? ORDER BY sku", (audit_id,))
+            st.dataframe(pd.DataFrame(audit, columns=["SKU", "System", "Counted", "Variance"]),
+                         use_container_width=True, key="count_audit_df")
         confirms = query("SELECT * FROM count_confirmations ORDER BY confirmed_at DESC")
         df_confirm = pd.DataFrame(confirms, columns=[T("username"), T("hub"), "Time"])
         st.subheader(T("confirmed_counts"))
@@ -754,7 +1744,7 @@ if menu == "Google Sheets" and role in ["Admin", "Hub Manager", "Retail"]:
 if menu == "Messages":
     st.header("📢 Internal Messaging")
     if role == "Admin":
-        users = [u[0] for u in query("SELECT username FROM users WHERE username != ?", (username,))]
+        users = [u[0] for u in query("SELECT username FROM users WHERE username != ? AND role != 'System'", (username,))]
         to_label = T("to")
         subject_placeholder = T("subject")
     else:
@@ -776,6 +1766,14 @@ if menu == "Messages":
         st.success("✅ Message sent!")
         st.rerun()
 
+    if role == "Admin":
+        with st.expander("🔔 Notification Outbox"):
+            status = dict(query("SELECT status, COUNT(*) FROM outbox GROUP BY status"))
+            st.write(" · ".join(f"{k}: {v}" for k, v in sorted(status.items())) or "Empty")
+            recent = query("SELECT id, created_at, kind, hub, subject, status, attempts, error FROM outbox ORDER BY id DESC LIMIT 50")
+            st.dataframe(pd.DataFrame(recent, columns=["ID", "Created", "Kind", T("hub"), T("subject"), "Status", "Attempts", "Error"]),
+                         use_container_width=True, key="outbox_df")
+
     st.markdown("---")
     st.subheader(T("your_threads"))
     threads = query("SELECT DISTINCT thread FROM messages WHERE sender=? OR receiver=? ORDER BY timestamp DESC", (username, username))
@@ -794,6 +1792,9 @@ if menu == "Messages":
             if st.button(T("send_reply"), key=f"reply_btn_{t[0]}"):
                 last_receiver = [m[1] for m in reversed(thread_msgs) if m[1] != username]
                 reply_to = last_receiver[0] if last_receiver else users[0]
+                if reply_to == notifier.SENDER:  # nobody reads the notifier's inbox: replies go to HQ
+                    admins = [r[0] for r in query("SELECT username FROM users WHERE role='Admin' AND username != ?", (username,))]
+                    reply_to = admins[0] if admins else reply_to
                 if role == "Admin" or reply_to in users:
                     query(
                         "INSERT INTO messages (sender, receiver, message, thread, timestamp) VALUES (?, ?, ?, ?, ?)",
@@ -811,7 +1812,7 @@ if menu == "Shipments":
     if role == "Supplier":
         tracking = st.text_input(T("tracking_number"), key="supplier_tracking")
         carrier = st.text_input(T("carrier"), key="supplier_carrier")
-        hub_dest = st.selectbox(T("destination_hub"), ["Hub 1", "Hub 2", "Hub 3", "Retail"], key="supplier_dest_hub")
+        hub_dest = st.selectbox(T("destination_hub"), tenants.hub_names(), key="supplier_dest_hub")
         date = st.date_input(T("shipping_date"), value=datetime.today(), key="supplier_ship_date")
         if "supplier_skus" not in st.session_state:
             st.session_state["supplier_skus"] = [{"sku": "", "qty": 1}]
@@ -837,7 +1838,7 @@ if menu == "Shipments":
                 if new_sku.strip():
                     query(
                         "INSERT OR IGNORE INTO sku_info (sku, product_name, assigned_hubs) VALUES (?, ?, ?)",
-                        (new_sku.strip(), new_sku.strip(), "Hub 1,Hub 2,Hub 3,Retail"),
+                        (new_sku.strip(), new_sku.strip(), ",".join(tenants.hub_names())),
                         fetch=False,
                         commit=True
                     )
@@ -898,34 +1899,8 @@ if menu == "Shipments":
             if st.button(T("mark_received"), key="btn_admin_confirm_receive"):
                 if confirm:
                     record = df[df["ID"] == to_confirm].iloc[0]
-                    sku_list = [s.strip() for s in record["SKUs"].split(",") if s.strip()]
-                    for sku in sku_list:
-                        if " x " in sku:
-                            name, qty = sku.rsplit(" x ", 1)
-                            try:
-                                qty = int(qty)
-                            except:
-                                qty = 1
-                        else:
-                            name = sku
-                            qty = 1
-                        current = query("SELECT quantity FROM inventory WHERE sku=? AND hub=?", (name, record["Hub"]))
-                        curr_qty = current[0][0] if current else 0
-                        new_qty = curr_qty + qty
-                        query(
-                            "INSERT INTO inventory (sku, hub, quantity) VALUES (?, ?, ?) ON CONFLICT(sku, hub) DO UPDATE SET quantity=?",
-                            (name, record["Hub"], new_qty, new_qty),
-                            fetch=False,
-                            commit=True
-                        )
-                        query(
-                            "INSERT INTO logs VALUES (?, ?, ?, ?, ?, ?, ?)",
-                            (datetime.now().isoformat(), username, name, record["Hub"], "IN", qty, f"Shipment {record['ID']}"),
-                            fetch=False,
-                            commit=True
-                        )
-                    query("UPDATE shipments SET status='Received' WHERE id=?", (to_confirm,), fetch=False, commit=True)
-                    st.success(T("shipment_confirmed"))
+                    if receive_shipment(int(record["ID"]), record["Hub"], record["SKUs"], username):
+                        st.success(T("shipment_confirmed"))
                     st.rerun()
         # Admin delete shipment option
         if role == "Admin":
@@ -953,34 +1928,8 @@ if menu == "Incoming Shipments" and role == "Hub Manager":
                 st.write(f"Date: {row['Date']}")
                 confirm = st.checkbox(f"{T('mark_received')} {row['ID']}", key=f"hubman_confirm_{row['ID']}")
                 if confirm:
-                    sku_list = [s.strip() for s in row["SKUs"].split(",") if s.strip()]
-                    for sku in sku_list:
-                        if " x " in sku:
-                            name, qty = sku.rsplit(" x ", 1)
-                            try:
-                                qty = int(qty)
-                            except:
-                                qty = 1
-                        else:
-                            name = sku
-                            qty = 1
-                        current = query("SELECT quantity FROM inventory WHERE sku=? AND hub=?", (name, hub))
-                        curr_qty = current[0][0] if current else 0
-                        new_qty = curr_qty + qty
-                        query(
-                            "INSERT INTO inventory (sku, hub, quantity) VALUES (?, ?, ?) ON CONFLICT(sku, hub) DO UPDATE SET quantity=?",
-                            (name, hub, new_qty, new_qty),
-                            fetch=False,
-                            commit=True
-                        )
-                        query(
-                            "INSERT INTO logs VALUES (?, ?, ?, ?, ?, ?, ?)",
-                            (datetime.now().isoformat(), username, name, hub, "IN", qty, f"Shipment {row['ID']}"),
-                            fetch=False,
-                            commit=True
-                        )
-                    query("UPDATE shipments SET status='Received' WHERE id=?", (row['ID'],), fetch=False, commit=True)
-                    st.success(T("shipment_confirmed"))
+                    if receive_shipment(int(row["ID"]), hub, row["SKUs"], username):
+                        st.success(T("shipment_confirmed"))
                     st.rerun()
     else:
         st.info("No pending shipments for your hub.")
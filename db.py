@@ -0,0 +1,319 @@
+import os
+import queue
+import random
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+
+DB = Path(os.environ.get("KISS_DB", Path(__file__).parent / "ttt_inventory.db"))
+
+# Multi-tenant mode routes each session to its own database file; the active one is a
+# context variable so every query() without an explicit path follows the current tenant.
+_current = ContextVar("kiss_db", default=None)
+
+# Pooled handles: up to POOL_PER_DB idle connections per database, for at most
+# POOL_DATABASES databases (least recently used are closed first), and databases
+# untouched for POOL_IDLE seconds are closed entirely.
+POOL_PER_DB = int(os.environ.get("KISS_POOL_PER_DB", 4))
+POOL_DATABASES = int(os.environ.get("KISS_POOL_DATABASES", 64))
+POOL_IDLE = float(os.environ.get("KISS_POOL_IDLE", 300))
+
+# Multi-worker settings. Several Streamlit processes may share one database file:
+# writes take the write lock up front with BEGIN IMMEDIATE and back off
+# exponentially while another process holds it, for up to WRITE_TIMEOUT seconds.
+BUSY_TIMEOUT_MS = 5000
+WRITE_TIMEOUT = float(os.environ.get("KISS_WRITE_TIMEOUT", BUSY_TIMEOUT_MS / 1000))
+BACKOFF_BASE = float(os.environ.get("KISS_BACKOFF_BASE", 0.005))
+BACKOFF_MAX = float(os.environ.get("KISS_BACKOFF_MAX", 0.5))
+# KISS_WRITE_QUEUE=1 funnels every write in this process through one writer thread
+WRITE_QUEUE = os.environ.get("KISS_WRITE_QUEUE", "0") == "1"
+QUEUE_BATCH = 50
+
+_READ_PREFIXES = ("SELECT", "PRAGMA", "EXPLAIN")
+_wal_ready = set()
+_wal_lock = threading.Lock()
+
+
+def current_db():
+    return _current.get() or DB
+
+
+def set_current(path):
+    """Make path the database for this thread/context (None falls back to DB)."""
+    return _current.set(Path(path) if path else None)
+
+
+@contextmanager
+def use_db(path):
+    token = set_current(path)
+    try:
+        yield
+    finally:
+        _current.reset(token)
+
+
+class LockMetrics:
+    def __init__(self, window=2000):
+        self._lock = threading.Lock()
+        self._waits = deque(maxlen=window)
+        self.writes = 0
+        self.retries = 0
+        self.failures = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def record(self, wait, attempts, ok=True):
+        with self._lock:
+            self.writes += 1
+            self.retries += attempts - 1
+            if not ok:
+                self.failures += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+            self._waits.append(wait)
+
+    def snapshot(self):
+        with self._lock:
+            waits = sorted(self._waits)
+            pct = lambda p: waits[min(len(waits) - 1, int(p * len(waits)))] * 1000 if waits else 0.0
+            return {
+                "writes": self.writes,
+                "retries": self.retries,
+                "failures": self.failures,
+                "avg_wait_ms": (self.total_wait / self.writes * 1000) if self.writes else 0.0,
+                "p50_wait_ms": pct(0.50),
+                "p95_wait_ms": pct(0.95),
+                "max_wait_ms": self.max_wait * 1000,
+            }
+
+
+metrics = LockMetrics()
+
+
+def is_locked(exc):
+    msg = str(exc).lower()
+    return "locked" in msg or "busy" in msg
+
+
+def _enable_wal(path):
+    key = str(path)
+    if key in _wal_ready:
+        return
+    with _wal_lock:
+        if key in _wal_ready:
+            return
+        try:
+            with sqlite3.connect(path, timeout=BUSY_TIMEOUT_MS / 1000) as conn:
+                conn.execute("PRAGMA journal_mode=WAL")
+            _wal_ready.add(key)
+        except sqlite3.OperationalError:
+            pass  # another worker is switching it; try again on the next connection
+
+
+def connect(path=None):
+    path = path or current_db()
+    _enable_wal(path)
+    conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT_MS / 1000, isolation_level=None, check_same_thread=False)
+    conn.execute("PRAGMA synchronous=NORMAL")
+    # REPLACE conflicts fire DELETE triggers too, so trigger-maintained tables stay exact
+    conn.execute("PRAGMA recursive_triggers=ON")
+    return conn
+
+
+def _begin_immediate(conn):
+    # busy_timeout=0 so a held lock fails fast and the backoff below is what waits (and is measured)
+    conn.execute("PRAGMA busy_timeout=0")
+    start = time.perf_counter()
+    deadline = start + WRITE_TIMEOUT
+    attempt = 0
+    while True:
+        attempt += 1
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            metrics.record(time.perf_counter() - start, attempt)
+            conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+            return
+        except sqlite3.OperationalError as e:
+            remaining = deadline - time.perf_counter()
+            if not is_locked(e) or remaining <= 0:
+                metrics.record(time.perf_counter() - start, attempt, ok=False)
+                conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+                raise
+            delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (attempt - 1))
+            time.sleep(min(remaining, delay * random.uniform(0.5, 1.0)))
+
+
+class _Pool:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._idle = OrderedDict()  # path -> (last used, [connections]), least recent first
+
+    def acquire(self, path):
+        key = str(path)
+        with self._lock:
+            self._evict(time.monotonic())
+            entry = self._idle.get(key)
+            if entry and entry[1]:
+                return entry[1].pop()
+        return connect(path)
+
+    def release(self, path, conn):
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        key = str(path)
+        with self._lock:
+            _, conns = self._idle.pop(key, (None, []))
+            if len(conns) < POOL_PER_DB:
+                conns.append(conn)
+            else:
+                conn.close()
+            self._idle[key] = (time.monotonic(), conns)
+            self._evict(time.monotonic())
+
+    def _evict(self, now):
+        while self._idle:
+            key, (last_used, conns) = next(iter(self._idle.items()))
+            if len(self._idle) <= POOL_DATABASES and now - last_used < POOL_IDLE:
+                break
+            del self._idle[key]
+            for conn in conns:
+                conn.close()
+
+    def close(self, path=None):
+        with self._lock:
+            keys = [str(path)] if path else list(self._idle)
+            for key in keys:
+                for conn in self._idle.pop(key, (None, []))[1]:
+                    conn.close()
+
+    def stats(self):
+        with self._lock:
+            return {"databases": len(self._idle), "connections": sum(len(c) for _, c in self._idle.values())}
+
+
+pool = _Pool()
+
+
+@contextmanager
+def pooled(path=None):
+    path = path or current_db()
+    conn = pool.acquire(path)
+    try:
+        yield conn
+    except BaseException:
+        conn.close()
+        raise
+    else:
+        pool.release(path, conn)
+
+
+def read_once(sql, params=(), path=None):
+    """One read on a short-lived read-only connection, bypassing the pool.
+
+    For background checks across many databases: they never create a file, take a
+    lock, or keep an otherwise idle database in the pool.
+    """
+    uri = Path(path or current_db()).resolve().as_uri() + "?mode=ro"
+    conn = sqlite3.connect(uri, uri=True, timeout=BUSY_TIMEOUT_MS / 1000)
+    try:
+        return conn.execute(sql, params).fetchall()
+    finally:
+        conn.close()
+
+
+def _write_direct(fn, path=None):
+    with pooled(path) as conn:
+        _begin_immediate(conn)
+        try:
+            result = fn(conn.cursor())
+            conn.execute("COMMIT")
+            return result
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+
+
+class _WriterThread:
+    """Single writer per process: drains queued jobs and commits them together."""
+
+    def __init__(self):
+        self.jobs = queue.Queue()
+        self.thread = threading.Thread(target=self._run, name="kiss-db-writer", daemon=True)
+        self.thread.start()
+
+    def submit(self, fn, path):
+        future = Future()
+        self.jobs.put((fn, path, future))
+        return future.result()
+
+    def _run(self):
+        while True:
+            batch = [self.jobs.get()]
+            while len(batch) < QUEUE_BATCH:
+                try:
+                    batch.append(self.jobs.get_nowait())
+                except queue.Empty:
+                    break
+            by_path = {}
+            for job in batch:
+                by_path.setdefault(str(job[1]), []).append(job)
+            for path, jobs in by_path.items():
+                self._commit_group(path, jobs)
+
+    def _commit_group(self, path, jobs):
+        # Each job gets its own savepoint so one failure doesn't undo its neighbours
+        def run_all(cur):
+            outcomes = []
+            for fn, _, _ in jobs:
+                cur.execute("SAVEPOINT job")
+                try:
+                    outcomes.append((True, fn(cur)))
+                    cur.execute("RELEASE job")
+                except Exception as e:
+                    cur.execute("ROLLBACK TO job")
+                    cur.execute("RELEASE job")
+                    outcomes.append((False, e))
+            return outcomes
+        try:
+            outcomes = _write_direct(run_all, path)
+        except Exception as e:
+            outcomes = [(False, e)] * len(jobs)
+        for (_, _, future), (ok, value) in zip(jobs, outcomes):
+            if ok:
+                future.set_result(value)
+            else:
+                future.set_exception(value)
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def run_write(fn, path=None):
+    """Run fn(cursor) inside one write transaction and return its result."""
+    global _writer
+    path = path or current_db()  # resolved here: the writer thread doesn't share our context
+    if not WRITE_QUEUE:
+        return _write_direct(fn, path)
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = _WriterThread()
+    return _writer.submit(fn, path)
+
+
+def query(sql, params=(), fetch=True, commit=True, path=None):
+    if commit and not sql.lstrip().upper().startswith(_READ_PREFIXES):
+        def tx(cur):
+            cur.execute(sql, params)
+            return cur.fetchall() if fetch else None
+        return run_write(tx, path)
+    with pooled(path) as conn:
+        cur = conn.execute(sql, params)
+        return cur.fetchall() if fetch else None
@@ -0,0 +1,153 @@
+import gzip
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+from db import current_db, query
+
+# Download artifacts (CSV exports) built on first request and cached by data version.
+# Every exported table has a version row bumped by triggers, so a cache key of
+# (export, filters, versions) is only ever served for exactly the data it was built from.
+# A small in-memory LRU sits in front of a shared on-disk LRU that all workers use.
+# Backups skip the disk tier.
+VERSIONED = {
+    "users": "users", "inventory": "inventory", "logs": "log_entries", "sku_info": "sku_info",
+    "shipments": "shipments", "messages": "messages", "count_confirmations": "count_confirmations",
+}
+# Exports hold password hashes and business data: the disk tier lives in a private (0700)
+# directory next to the app, and is skipped if that directory belongs to someone else.
+EXPORT_DIR = Path(os.environ.get("KISS_EXPORT_DIR", Path(__file__).parent / ".kiss-exports"))
+MEMORY_BYTES = int(os.environ.get("KISS_EXPORT_MEMORY_MB", 64)) * 1024 * 1024
+DISK_BYTES = int(os.environ.get("KISS_EXPORT_DISK_MB", 512)) * 1024 * 1024
+
+_memory = OrderedDict()
+_memory_size = 0
+_lock = threading.Lock()
+_private_dirs = {}
+
+
+def ensure_tables(path=None):
+    query("CREATE TABLE IF NOT EXISTS table_versions (name TEXT PRIMARY KEY, version INTEGER DEFAULT 0)",
+          fetch=False, path=path)
+    # Versions are random rather than counters, and '_db_id' identifies this database file,
+    # so a restored backup or a re-created tenant of the same name never reuses an old key.
+    query("INSERT OR IGNORE INTO table_versions (name, version) VALUES ('_db_id', random())", fetch=False, path=path)
+    for (trigger,) in query("""SELECT name FROM sqlite_master WHERE type='trigger'
+                               AND name LIKE 'trg_version_%' AND sql LIKE '%version + 1%'""", path=path):
+        query(f"DROP TRIGGER {trigger}", fetch=False, path=path)
+    for name, table in VERSIONED.items():
+        query("INSERT OR IGNORE INTO table_versions (name, version) VALUES (?, random())", (name,),
+              fetch=False, path=path)
+        for event in ["INSERT", "UPDATE", "DELETE"]:
+            query(f"""CREATE TRIGGER IF NOT EXISTS trg_version_{table}_{event.lower()} AFTER {event} ON {table}
+                BEGIN
+                    UPDATE table_versions SET version = random() WHERE name = '{name}';
+                END""", fetch=False, path=path)
+
+
+def versions(*names, path=None):
+    marks = ",".join("?" * len(names))
+    found = dict(query(f"SELECT name, version FROM table_versions WHERE name IN ({marks})", names, path=path))
+    return tuple(found.get(n, 0) for n in names)
+
+
+def _key(name, params, tables, compress, path):
+    raw = repr((str(path or current_db()), name, params, versions("_db_id", *tables, path=path), compress))
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+
+def _remember(key, data):
+    global _memory_size
+    with _lock:
+        if key in _memory:
+            _memory.move_to_end(key)
+            return
+        _memory[key] = data
+        _memory_size += len(data)
+        while _memory_size > MEMORY_BYTES and len(_memory) > 1:
+            _, old = _memory.popitem(last=False)
+            _memory_size -= len(old)
+
+
+def _disk_dir():
+    """EXPORT_DIR once it is known to be a private directory of this user, else None."""
+    key = str(EXPORT_DIR)
+    if key not in _private_dirs:
+        try:
+            EXPORT_DIR.mkdir(mode=0o700, parents=True, exist_ok=True)
+            st = EXPORT_DIR.lstat()
+            owned = not EXPORT_DIR.is_symlink() and (not hasattr(os, "getuid") or st.st_uid == os.getuid())
+            if owned and st.st_mode & 0o077:
+                EXPORT_DIR.chmod(0o700)
+        except OSError:
+            owned = False
+        if not owned:
+            print(f"⚠️ Export cache {EXPORT_DIR} is not a private directory of this user; caching in memory only")
+        _private_dirs[key] = owned
+    return EXPORT_DIR if _private_dirs[key] else None
+
+
+def _evict_disk(folder):
+    files = []
+    for f in folder.glob("*.bin"):
+        try:
+            stat = f.stat()
+        except FileNotFoundError:  # another worker evicted it first
+            continue
+        files.append((stat.st_mtime, stat.st_size, f))
+    files.sort()
+    total = sum(size for _, size, _ in files)
+    for _, size, f in files[:-1]:
+        if total <= DISK_BYTES:
+            break
+        total -= size
+        f.unlink(missing_ok=True)
+
+
+def _lookup(key, disk=True):
+    with _lock:
+        if key in _memory:
+            _memory.move_to_end(key)
+            return _memory[key]
+    folder = _disk_dir() if disk else None
+    if folder is None:
+        return None
+    file = folder / f"{key}.bin"
+    try:
+        data = file.read_bytes()
+        os.utime(file)
+    except FileNotFoundError:
+        return None
+    _remember(key, data)
+    return data
+
+
+def peek(name, params, tables, compress=False, path=None, disk=True):
+    """Cached bytes for this export at the current data version, or None."""
+    return _lookup(_key(name, params, tables, compress, path), disk)
+
+
+def get_artifact(name, params, tables, build, compress=False, path=None, disk=True):
+    """Return the export's bytes, calling build() -> bytes only on a cache miss.
+
+    disk=False keeps the artifact in this worker's memory only (backups).
+    """
+    key = _key(name, params, tables, compress, path)
+    data = _lookup(key, disk)
+    if data is not None:
+        return data
+    data = build()
+    if compress:
+        data = gzip.compress(data, compresslevel=6)
+    _remember(key, data)
+    folder = _disk_dir() if disk else None
+    if folder is not None:
+        tmp = folder / f"{key}.{os.getpid()}.{threading.get_ident()}.tmp"
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, folder / f"{key}.bin")
+        _evict_disk(folder)
+    return data
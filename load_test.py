@@ -0,0 +1,201 @@
+import argparse
+import multiprocessing as mp
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# Scripted concurrent sessions against app.py through streamlit.testing.v1.AppTest.
+# Every session works on a generated database (KISS_DB), never the real one.
+
+APP = str(Path(__file__).parent / "app.py")
+USERS = {
+    "Hub Manager": [("fox", "foxpass", "Hub 2"), ("slo", "hub1pass", "Hub 1"), ("carmen", "hub3pass", "Hub 3")],
+    "Retail": [("smooth", "retailpass", "Retail")],
+    "Supplier": [("angie", "shipit", "")],
+    "Admin": [("kevin", "adminpass", "HQ")],
+}
+DEFAULT_MIX = "Hub Manager:6,Retail:2,Supplier:1,Admin:1"
+
+
+class Session:
+    def __init__(self, role, timeout):
+        from streamlit.testing.v1 import AppTest
+        self.user, self.password, self.hub = random.choice(USERS[role])
+        self.role = role
+        self.at = AppTest.from_file(APP, default_timeout=timeout)
+        self.latencies = []
+        self.lock_errors = 0
+        self.errors = []
+
+    def run(self, action=None):
+        start = time.perf_counter()
+        try:
+            (action or self.at).run()
+        except Exception as e:  # timeouts and runner failures count as errors, the session goes on
+            self.errors.append(repr(e))
+            return False
+        finally:
+            self.latencies.append(time.perf_counter() - start)
+        for exc in self.at.exception:
+            if "locked" in str(exc.value).lower():
+                self.lock_errors += 1
+            else:
+                self.errors.append(str(exc.value))
+        return not self.at.exception
+
+    def login(self):
+        self.run()
+        self.at.sidebar.text_input(key="login_user").input(self.user)
+        self.at.sidebar.text_input(key="login_pw").input(self.password)
+        return self.run(self.at.sidebar.button(key="login_btn").click())
+
+    def menu(self, name):
+        return self.run(self.at.sidebar.radio(key="menu_radio").set_value(name))
+
+    def update_stock(self):
+        self.menu("Update Stock")
+        self.at.radio(key="update_action_radio").set_value(random.choice(["IN", "OUT"]))
+        self.at.number_input(key="update_qty").set_value(random.randint(1, 3))
+        self.run(self.at.button(key="btn_update_stock").click())
+
+    def bulk_update(self):
+        self.menu("Bulk Update")
+        keys = [t.key for t in self.at.text_input if t.key and t.key.startswith("adj_")]
+        for key in random.sample(keys, min(3, len(keys))):
+            self.at.text_input(key=key).input(f"+{random.randint(1, 5)}")
+        if self.at.form_submit_button:
+            self.run(self.at.form_submit_button[0].click())
+
+    def scan(self):
+        import db
+        self.menu("Scan")
+        skus = [r[0] for r in db.query("SELECT sku FROM sku_info WHERE assigned_hubs LIKE ?", (f"%{self.hub}%",))]
+        for _ in range(random.randint(3, 10)):
+            self.run(self.at.text_input(key="scan_code").input(random.choice(skus)))
+        self.run(self.at.button(key="btn_commit_scans").click())
+
+    def send_message(self):
+        self.menu("Messages")
+        self.at.text_input(key="message_subject").input(f"load test {self.user}")
+        self.at.text_area(key="message_body").input("ping")
+        self.run(self.at.button(key="btn_send_message").click())
+
+    def receive_shipment(self):
+        self.menu("Incoming Shipments")
+        boxes = [c for c in self.at.checkbox if c.key and c.key.startswith("hubman_confirm_")]
+        if boxes:
+            self.run(random.choice(boxes).check())
+
+    def submit_shipment(self):
+        self.menu("Shipments")
+        self.at.text_input(key="supplier_tracking").input(f"LT{random.randint(0, 10**9)}")
+        self.at.text_input(key="supplier_carrier").input("UPS")
+        self.at.selectbox(key="supplier_dest_hub").set_value(random.choice(["Hub 1", "Hub 2", "Hub 3"]))
+        self.run(self.at.button(key="submit_supplier_shipment").click())
+
+    def browse(self, *menus):
+        for name in menus:
+            self.menu(name)
+
+    def step(self):
+        if self.role == "Hub Manager":
+            random.choice([self.update_stock, self.bulk_update, self.scan, self.send_message, self.receive_shipment,
+                           lambda: self.browse("Inventory", "Dashboard")])()
+        elif self.role == "Retail":
+            random.choice([self.update_stock, self.bulk_update, self.scan, lambda: self.browse("Inventory", "Count")])()
+        elif self.role == "Supplier":
+            self.submit_shipment()
+        else:
+            random.choice([self.send_message, lambda: self.browse("Logs", "Dashboard", "Shipments", "Inventory")])()
+
+
+def generate_db(path, logs, shipments):
+    from streamlit.testing.v1 import AppTest
+    AppTest.from_file(APP, default_timeout=120).run()  # creates tables and seed data in KISS_DB
+    import db
+    skus = db.query("SELECT sku, hub FROM inventory")
+    start = datetime.now() - timedelta(days=180)
+    users = {"Hub 1": "slo", "Hub 2": "fox", "Hub 3": "carmen", "Retail": "smooth"}
+
+    def fill(cur):
+        cur.execute("UPDATE inventory SET quantity = 200")
+        rows = []
+        for i in range(logs):
+            sku, hub = random.choice(skus)
+            ts = start + timedelta(seconds=i * 180 * 86400 / max(logs, 1))
+            rows.append((ts.isoformat(), users.get(hub, "kevin"), sku, hub, random.choice(["IN", "OUT"]),
+                         random.randint(1, 10), ""))
+        cur.executemany("INSERT INTO logs VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+        picks = [random.choice(skus) for _ in range(shipments)]
+        cur.executemany(
+            "INSERT INTO shipments (supplier, tracking, carrier, hub, skus, date, status) VALUES (?, ?, ?, ?, ?, ?, 'Pending')",
+            [("angie", f"GEN{i}", "UPS", hub, f"{sku} x {random.randint(1, 20)}", str(datetime.today().date()))
+             for i, (sku, hub) in enumerate(picks)]
+        )
+    db.run_write(fill)
+
+
+# AppTest swaps a process-global mock Runtime in and out around every run, so
+# sessions can't share a process; each simulated user gets its own.
+def _session_entry(role, iterations, timeout, seed, out):
+    random.seed(seed)
+    s = Session(role, timeout)
+    try:
+        if s.login():
+            for _ in range(iterations):
+                s.step()
+    except Exception as e:  # a widget missing from the page ends this session, not the run
+        s.errors.append(repr(e))
+    out.put({"latencies": s.latencies, "lock_errors": s.lock_errors, "errors": s.errors})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent-user load test for the inventory app.")
+    parser.add_argument("--sessions", type=int, default=10, help="Concurrent sessions")
+    parser.add_argument("--iterations", type=int, default=5, help="Actions per session after login")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="Role weights, e.g. 'Hub Manager:6,Admin:1'")
+    parser.add_argument("--logs", type=int, default=20_000, help="Synthetic log rows in the generated database")
+    parser.add_argument("--shipments", type=int, default=50, help="Pending shipments in the generated database")
+    parser.add_argument("--timeout", type=float, default=60, help="Per-rerun timeout in seconds")
+    parser.add_argument("--db", help="Use this database instead of generating one")
+    args = parser.parse_args()
+
+    if args.db:
+        os.environ["KISS_DB"] = str(Path(args.db).resolve())
+    else:
+        path = Path(tempfile.mkdtemp(prefix="kiss-load-")) / "load.db"
+        os.environ["KISS_DB"] = str(path)
+        print(f"Generating {path} ({args.logs} logs, {args.shipments} shipments)...")
+        generate_db(path, args.logs, args.shipments)
+
+    weights = [(r.strip(), int(w)) for r, w in (part.split(":") for part in args.mix.split(","))]
+    roles = random.choices([r for r, _ in weights], weights=[w for _, w in weights], k=args.sessions)
+
+    out = mp.Queue()
+    procs = [mp.Process(target=_session_entry, args=(role, args.iterations, args.timeout, n, out))
+             for n, role in enumerate(roles)]
+    start = time.perf_counter()
+    for p in procs:
+        p.start()
+    results = [out.get() for _ in procs]
+    for p in procs:
+        p.join()
+    elapsed = time.perf_counter() - start
+
+    latencies = sorted(l for r in results for l in r["latencies"])
+    pct = lambda p: latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000 if latencies else 0.0
+    errors = [e for r in results for e in r["errors"]]
+    print(f"== Load test: {args.sessions} sessions x {args.iterations} actions ==")
+    print("Roles: " + ", ".join(f"{r}={roles.count(r)}" for r, _ in weights))
+    print(f"Reruns: {len(latencies)} in {elapsed:.1f}s ({len(latencies) / elapsed:.1f} reruns/s)")
+    print(f"Rerun latency ms: p50={pct(0.50):.0f} p95={pct(0.95):.0f} p99={pct(0.99):.0f} max={pct(1.0):.0f}")
+    print(f"Lock errors: {sum(r['lock_errors'] for r in results)}  Other errors: {len(errors)}")
+    for e in sorted(set(errors))[:5]:
+        print(f"  - {e[:200]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+import argparse
+import json
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import reconcile
+import tenants
+from db import connect, current_db, query, read_once, run_write
+
+# Database upkeep: statistics, incremental vacuum, integrity check, WAL checkpoint,
+# purging of soft-deleted rows and an inventory-vs-ledger reconciliation report. Runs on demand (Admin → Maintenance, or this script
+# from cron) or from the in-app scheduler during the off-peak window.
+TASKS = ["purge", "optimize", "vacuum", "integrity", "checkpoint", "reconcile"]
+RETENTION_DAYS = int(os.environ.get("KISS_RETENTION_DAYS", 90))
+OFF_PEAK_HOURS = range(int(os.environ.get("KISS_OFF_PEAK_START", 2)), int(os.environ.get("KISS_OFF_PEAK_END", 5)))
+MIN_INTERVAL = timedelta(hours=20)
+SCHEDULER_ENABLED = os.environ.get("KISS_MAINTENANCE_SCHEDULER", "1") == "1"
+VACUUM_PAGES = 2000
+
+
+def ensure_table(path=None):
+    query("""CREATE TABLE IF NOT EXISTS maintenance_runs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        started_at TEXT,
+        finished_at TEXT,
+        trigger TEXT,
+        status TEXT,
+        size_before INTEGER,
+        size_after INTEGER,
+        details TEXT)""", fetch=False, path=path)
+
+
+def db_size(path=None):
+    path = Path(path or current_db())
+    wal = Path(f"{path}-wal")
+    return path.stat().st_size + (wal.stat().st_size if wal.exists() else 0)
+
+
+def _purge(conn, path, retention_days):
+    cutoff = (datetime.now() - timedelta(days=retention_days)).isoformat()
+    def tx(cur):
+        shipments = cur.execute("""DELETE FROM shipments WHERE status='Deleted' AND COALESCE(
+                (SELECT deleted_at FROM shipment_deletions d WHERE d.shipment_id = shipments.id), date) < ?""",
+            (cutoff,)).rowcount
+        cur.execute("DELETE FROM shipment_deletions WHERE shipment_id NOT IN (SELECT id FROM shipments)")
+        cur.execute("""DELETE FROM count_lines WHERE session_id IN (
+                SELECT id FROM count_sessions WHERE status='Cancelled' AND started_at < ?)""", (cutoff,))
+        counts = cur.execute("DELETE FROM count_sessions WHERE status='Cancelled' AND started_at < ?",
+                             (cutoff,)).rowcount
+        return {"shipments": shipments, "count_sessions": counts}
+    return run_write(tx, path)
+
+
+def _optimize(conn, path, retention_days):
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE name='search_index'").fetchone():
+        conn.execute("INSERT INTO search_index (search_index) VALUES ('optimize')")  # merge FTS segments
+    if not conn.execute("SELECT 1 FROM sqlite_master WHERE name='sqlite_stat1'").fetchone():
+        conn.execute("ANALYZE")
+        return "analyze"
+    conn.execute("PRAGMA optimize")
+    return "optimize"
+
+
+def _vacuum(conn, path, retention_days):
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+        # Switching an existing file to incremental mode needs one full VACUUM
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        conn.execute("VACUUM")
+        return "converted to auto_vacuum=INCREMENTAL"
+    free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    conn.execute(f"PRAGMA incremental_vacuum({VACUUM_PAGES})")
+    return f"freed {min(free, VACUUM_PAGES)} of {free} free pages"
+
+
+def _integrity(conn, path, retention_days):
+    rows = [r[0] for r in conn.execute("PRAGMA integrity_check").fetchall()]
+    return "ok" if rows == ["ok"] else rows[:20]
+
+
+def _checkpoint(conn, path, retention_days):
+    busy, log, done = conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchone()
+    return {"busy": busy, "wal_pages": log, "checkpointed": done}
+
+
+def _reconcile(conn, path, retention_days):
+    # Report only; corrections are posted from Admin → Reconcile or reconcile.py --fix
+    result = reconcile.reconcile(trigger="maintenance", path=path)
+    return {"run": result["id"], "log_rows": result["log_rows"], "discrepancies": len(result["discrepancies"])}
+
+
+_RUNNERS = {"purge": _purge, "optimize": _optimize, "vacuum": _vacuum,
+            "integrity": _integrity, "checkpoint": _checkpoint, "reconcile": _reconcile}
+
+
+def run_maintenance(tasks=None, retention_days=RETENTION_DAYS, trigger="manual", path=None, run_id=None):
+    ensure_table(path)
+    tasks = TASKS if tasks is None else tasks
+    size_before = db_size(path)
+    if run_id is None:
+        run_id = run_write(lambda cur: cur.execute(
+            "INSERT INTO maintenance_runs (started_at, trigger, status, size_before) VALUES (?, ?, 'Running', ?)",
+            (datetime.now().isoformat(), trigger, size_before)).lastrowid, path)
+    details, status = {}, "OK"
+    conn = connect(path)
+    try:
+        for task in tasks:
+            start = time.perf_counter()
+            try:
+                result = _RUNNERS[task](conn, path, retention_days)
+            except Exception as e:
+                result, status = f"error: {e}", "Failed"
+            details[task] = {"seconds": round(time.perf_counter() - start, 3), "result": result}
+            if task == "integrity" and result != "ok":
+                status = "Failed"
+    finally:
+        conn.close()
+    size_after = db_size(path)
+    query("UPDATE maintenance_runs SET finished_at=?, status=?, size_after=?, details=? WHERE id=?",
+          (datetime.now().isoformat(), status, size_after, json.dumps(details), run_id), fetch=False, path=path)
+    return {"id": run_id, "status": status, "size_before": size_before, "size_after": size_after, "details": details}
+
+
+# --- Scheduler ---
+# Several workers may run the scheduler; claiming the run inside a write transaction
+# makes sure only one of them starts it per window.
+def is_due(path=None, now=None):
+    """Read-only pre-check for the scheduler; claim_scheduled_run() decides for real."""
+    now = now or datetime.now()
+    if now.hour not in OFF_PEAK_HOURS:
+        return False
+    last = read_once("SELECT MAX(started_at) FROM maintenance_runs WHERE trigger='scheduled'", path=path)[0][0]
+    return not last or now - datetime.fromisoformat(last) >= MIN_INTERVAL
+
+
+def claim_scheduled_run(path=None, now=None):
+    now = now or datetime.now()
+    if now.hour not in OFF_PEAK_HOURS:
+        return None
+    ensure_table(path)
+    def tx(cur):
+        last = cur.execute("SELECT MAX(started_at) FROM maintenance_runs WHERE trigger='scheduled'").fetchone()[0]
+        if last and now - datetime.fromisoformat(last) < MIN_INTERVAL:
+            return None
+        return cur.execute(
+            "INSERT INTO maintenance_runs (started_at, trigger, status, size_before) VALUES (?, 'scheduled', 'Running', ?)",
+            (now.isoformat(), db_size(path))).lastrowid
+    return run_write(tx, path)
+
+
+def run_if_due(path=None):
+    run_id = claim_scheduled_run(path)
+    if run_id:
+        return run_maintenance(trigger="scheduled", path=path, run_id=run_id)
+    return None
+
+
+def start_scheduler(interval=900, path=None):
+    def loop():
+        while True:
+            # Multi-tenant: every tenant database gets its own off-peak run; databases that
+            # aren't due are only read, so idle tenants stay out of the connection pool
+            for db_path in ([path] if path else tenants.database_paths("maintenance_runs")):
+                try:
+                    if is_due(db_path):
+                        run_if_due(db_path)
+                except Exception as e:
+                    print(f"⚠️ Scheduled maintenance failed for {db_path}: {e}")
+            time.sleep(interval)
+    thread = threading.Thread(target=loop, name="kiss-maintenance", daemon=True)
+    thread.start()
+    return thread
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run database maintenance on ttt_inventory.db.")
+    parser.add_argument("--tasks", default=",".join(TASKS), help=f"Comma-separated subset of {','.join(TASKS)}")
+    parser.add_argument("--retention-days", type=int, default=RETENTION_DAYS)
+    parser.add_argument("--if-due", action="store_true", help="Only run inside the off-peak window, once per day")
+    args = parser.parse_args()
+    if args.if_due:
+        result = run_if_due()
+        if not result:
+            print("⏭️ Not due (outside the off-peak window or already ran).")
+            raise SystemExit(0)
+    else:
+        result = run_maintenance([t.strip() for t in args.tasks.split(",") if t.strip()], args.retention_days)
+    print(f"🧹 Maintenance run {result['id']}: {result['status']}")
+    print(f"   size {result['size_before'] / 1e6:.2f} MB → {result['size_after'] / 1e6:.2f} MB")
+    for task, info in result["details"].items():
+        print(f"   {task}: {info['seconds']}s — {info['result']}")
@@ -0,0 +1,229 @@
+import argparse
+import os
+import smtplib
+import socketserver
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+from email.message import EmailMessage
+
+import tenants
+from db import DB, query, read_once, run_write
+
+# Event notifications. Triggers write low-stock crossings and new/received shipments
+# to `outbox` in the same transaction as the change that caused them; nothing is ever
+# found by rescanning tables. A dispatcher thread (or this script) drains the outbox
+# in batches, folding each recipient's events into one in-app message and/or email.
+CHANNELS = [c.strip() for c in os.environ.get("KISS_NOTIFY_CHANNELS", "message").split(",") if c.strip()]
+DISPATCHER_ENABLED = os.environ.get("KISS_NOTIFIER", "1") == "1"
+SMTP_HOST = os.environ.get("KISS_SMTP_HOST", "localhost")
+SMTP_PORT = int(os.environ.get("KISS_SMTP_PORT", 1025))
+SMTP_FROM = os.environ.get("KISS_SMTP_FROM", "inventory@localhost")
+# "Hub 1=a@example.com,b@example.com;HQ=ops@example.com" — HQ receives admin notifications
+EMAILS = {hub.strip(): [a.strip() for a in addrs.split(",") if a.strip()]
+          for hub, _, addrs in (part.partition("=") for part in os.environ.get("KISS_NOTIFY_EMAILS", "").split(";"))
+          if hub.strip()}
+BATCH_SIZE = 200
+MAX_ATTEMPTS = 5
+CLAIM_TIMEOUT = timedelta(minutes=10)
+SENDER = "notifier"
+
+
+def ensure_tables(low_stock, path=None):
+    # The sender of notification messages is a real user, so threads and replies resolve;
+    # "!" never matches a password hash, so nobody can log in as it.
+    query("INSERT OR IGNORE INTO users (username, password, role, hub) VALUES (?, '!', 'System', 'HQ')",
+          (SENDER,), fetch=False, path=path)
+    query("""CREATE TABLE IF NOT EXISTS outbox (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        created_at TEXT,
+        kind TEXT,
+        hub TEXT,
+        subject TEXT,
+        status TEXT DEFAULT 'Pending',
+        attempts INTEGER DEFAULT 0,
+        claimed_at TEXT,
+        sent_at TEXT,
+        error TEXT)""", fetch=False, path=path)
+    query("CREATE INDEX IF NOT EXISTS idx_outbox_status ON outbox (status, id)", fetch=False, path=path)
+    now = "strftime('%Y-%m-%dT%H:%M:%f', 'now', 'localtime')"
+    for name, event, body in [
+        # Only the crossing from OK to low raises an event, not every movement while low
+        ("trg_outbox_low_stock", f"""AFTER UPDATE OF quantity ON inventory
+            WHEN NEW.quantity < {low_stock} AND OLD.quantity >= {low_stock}""",
+         f"""INSERT INTO outbox (created_at, kind, hub, subject)
+             VALUES ({now}, 'low_stock', NEW.hub, '🟥 Low stock: ' || NEW.sku || ' at ' || NEW.hub || ' (' || NEW.quantity || ' left)');"""),
+        ("trg_outbox_shipment_new", "AFTER INSERT ON shipments WHEN NEW.status = 'Pending'",
+         f"""INSERT INTO outbox (created_at, kind, hub, subject)
+             VALUES ({now}, 'shipment_new', NEW.hub, '🚚 New shipment ' || NEW.id || ' from ' || COALESCE(NEW.supplier, '?')
+                     || ' to ' || NEW.hub || ' (' || COALESCE(NEW.carrier, '') || ' ' || COALESCE(NEW.tracking, '') || ')');"""),
+        ("trg_outbox_shipment_received", """AFTER UPDATE OF status ON shipments
+            WHEN NEW.status = 'Received' AND OLD.status IS NOT 'Received'""",
+         f"""INSERT INTO outbox (created_at, kind, hub, subject)
+             VALUES ({now}, 'shipment_received', NEW.hub, '✅ Shipment ' || NEW.id || ' received at ' || NEW.hub);"""),
+    ]:
+        query(f"CREATE TRIGGER IF NOT EXISTS {name} {event} BEGIN {body} END", fetch=False, path=path)
+
+
+def _recipients(cur, kind, hub):
+    # Admins hear about shipments; the hub's own users hear about its stock and deliveries
+    admins = [r[0] for r in cur.execute("SELECT username FROM users WHERE role='Admin'")]
+    local = [r[0] for r in cur.execute("SELECT username FROM users WHERE hub=? AND role IN ('Hub Manager', 'Retail')", (hub,))]
+    if kind == "low_stock":
+        return local or admins
+    if kind == "shipment_new":
+        return admins + local
+    return admins
+
+
+def has_pending(path=None):
+    """Read-only check for work, so a quiet database is never locked by a claim."""
+    stale = (datetime.now() - CLAIM_TIMEOUT).isoformat()
+    try:
+        return bool(read_once("""SELECT 1 FROM outbox WHERE status='Pending'
+                                 OR (status='Sending' AND claimed_at < ?) LIMIT 1""", (stale,), path))
+    except sqlite3.OperationalError:  # no outbox yet (tenant not migrated)
+        return False
+
+
+def _claim(path, limit):
+    def tx(cur):
+        stale = (datetime.now() - CLAIM_TIMEOUT).isoformat()
+        cur.execute("UPDATE outbox SET status='Pending' WHERE status='Sending' AND claimed_at < ?", (stale,))
+        rows = cur.execute("SELECT id, kind, hub, subject FROM outbox WHERE status='Pending' ORDER BY id LIMIT ?",
+                           (limit,)).fetchall()
+        cur.executemany("UPDATE outbox SET status='Sending', claimed_at=?, attempts=attempts+1 WHERE id=?",
+                        [(datetime.now().isoformat(), r[0]) for r in rows])
+        digests = {}
+        for _, kind, hub, subject in rows:
+            for user in _recipients(cur, kind, hub):
+                digests.setdefault(user, []).append(subject)
+        return rows, digests
+    return run_write(tx, path)
+
+
+def _send_email(events):
+    by_address = {}
+    for _, kind, hub, subject in events:
+        targets = {"low_stock": [hub], "shipment_new": ["HQ", hub], "shipment_received": ["HQ"]}.get(kind, [])
+        for address in {a for t in targets for a in EMAILS.get(t, [])}:
+            by_address.setdefault(address, []).append(subject)
+    if not by_address:
+        return
+    with smtplib.SMTP(SMTP_HOST, SMTP_PORT, timeout=10) as smtp:
+        for address, subjects in by_address.items():
+            msg = EmailMessage()
+            msg["From"], msg["To"] = SMTP_FROM, address
+            msg["Subject"] = subjects[0] if len(subjects) == 1 else f"{len(subjects)} inventory notifications"
+            msg.set_content("\n".join(subjects))
+            smtp.send_message(msg)
+
+
+def dispatch(path=None, limit=BATCH_SIZE):
+    """Deliver one batch from the outbox; returns how many events were sent."""
+    events, digests = _claim(path, limit)
+    if not events:
+        return 0
+    ids = [(e[0],) for e in events]
+    try:
+        if "email" in CHANNELS:
+            _send_email(events)
+    except Exception as e:
+        run_write(lambda cur: cur.executemany(
+            f"""UPDATE outbox SET status = CASE WHEN attempts >= {MAX_ATTEMPTS} THEN 'Failed' ELSE 'Pending' END,
+                error = ? WHERE id = ?""", [(str(e)[:500], i) for (i,) in ids]), path)
+        return 0
+
+    def finish(cur):
+        now = datetime.now().isoformat()
+        if "message" in CHANNELS:
+            cur.executemany(
+                "INSERT INTO messages (sender, receiver, message, thread, timestamp) VALUES (?, ?, ?, ?, ?)",
+                [(SENDER, user, "\n\n".join(subjects), f"🔔 Notifications ({user})", now)
+                 for user, subjects in digests.items()])
+        cur.executemany("UPDATE outbox SET status='Sent', sent_at=?, error=NULL WHERE id=?", [(now, i) for (i,) in ids])
+    run_write(finish, path)
+    return len(events)
+
+
+def drain(path=None):
+    sent = 0
+    while True:
+        n = dispatch(path)
+        if not n:
+            return sent
+        sent += n
+
+
+def dispatch_all(path=None):
+    """One pass over path, or every database (all tenants); returns how many events were sent."""
+    sent = 0
+    for db_path in ([path] if path else tenants.database_paths()):
+        try:
+            if has_pending(db_path):
+                sent += drain(db_path)
+        except Exception as e:
+            print(f"⚠️ Notification dispatch failed for {db_path}: {e}")
+    return sent
+
+
+def start_dispatcher(interval=5, path=None):
+    def loop():
+        while True:
+            dispatch_all(path)
+            time.sleep(interval)
+    thread = threading.Thread(target=loop, name="kiss-notifier", daemon=True)
+    thread.start()
+    return thread
+
+
+# --- Local SMTP stand-in ---
+# Just enough SMTP to accept mail from the dispatcher and print it; for testing only.
+class _SinkHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        reply = lambda line: self.wfile.write(f"{line}\r\n".encode())
+        reply("220 kiss-smtp-sink ready")
+        data, in_data = [], False
+        for raw in self.rfile:
+            line = raw.decode(errors="replace").rstrip("\r\n")
+            if in_data:
+                if line == ".":
+                    in_data = False
+                    print("📧 " + "-" * 60 + "\n" + "\n".join(data), flush=True)
+                    data = []
+                    reply("250 OK")
+                else:
+                    data.append(line[1:] if line.startswith("..") else line)
+                continue
+            verb = line.split(" ", 1)[0].upper()
+            if verb == "DATA":
+                in_data = True
+                reply("354 End data with <CR><LF>.<CR><LF>")
+            elif verb == "QUIT":
+                reply("221 Bye")
+                return
+            elif verb in ("EHLO", "HELO", "MAIL", "RCPT", "RSET", "NOOP"):
+                reply("250 OK")
+            else:
+                reply("502 Command not implemented")
+
+
+def smtp_sink(port):
+    with socketserver.ThreadingTCPServer(("127.0.0.1", port), _SinkHandler) as server:
+        print(f"📮 SMTP sink listening on 127.0.0.1:{port}")
+        server.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Deliver queued inventory notifications.")
+    parser.add_argument("--loop", action="store_true", help="Keep dispatching every --interval seconds")
+    parser.add_argument("--interval", type=float, default=5)
+    parser.add_argument("--smtp-sink", type=int, metavar="PORT", help="Run a local SMTP stand-in that prints mail")
+    args = parser.parse_args()
+    if args.smtp_sink:
+        smtp_sink(args.smtp_sink)
+    elif args.loop:
+        start_dispatcher(args.interval).join()
+    else:
+        print(f"🔔 Delivered {drain()} notifications ({', '.join(CHANNELS)}) from {DB}")
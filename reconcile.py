@@ -0,0 +1,177 @@
+import argparse
+import json
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from db import DB, connect, query, run_write
+
+# Inventory-vs-ledger reconciliation. The ledger balance of a SKU at a hub is the
+# opening balance from the latest checkpoint plus every signed movement logged after
+# it (IN adds, OUT removes, COUNT entries already carry a signed variance). Anything
+# that disagrees with `inventory` is reported and, with --fix, corrected by posting a
+# COUNT entry so the ledger matches the shelf again. Run it from cron, from the daily
+# maintenance run, or from Admin → Reconcile.
+SIGNS = {"IN": 1, "OUT": -1, "COUNT": 1}
+REPORT_LIMIT = 200
+
+
+def ensure_tables(path=None):
+    query("""CREATE TABLE IF NOT EXISTS ledger_checkpoints (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        created_at TEXT,
+        log_id INTEGER,
+        source TEXT,
+        note TEXT)""", fetch=False, path=path)
+    query("""CREATE TABLE IF NOT EXISTS checkpoint_balances (
+        checkpoint_id INTEGER,
+        sku TEXT,
+        hub TEXT,
+        quantity INTEGER,
+        PRIMARY KEY (checkpoint_id, sku, hub))""", fetch=False, path=path)
+    query("""CREATE TABLE IF NOT EXISTS reconciliation_runs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        started_at TEXT,
+        trigger TEXT,
+        checkpoint_id INTEGER,
+        log_id INTEGER,
+        log_rows INTEGER,
+        discrepancies INTEGER,
+        corrected INTEGER,
+        seconds REAL,
+        details TEXT)""", fetch=False, path=path)
+
+
+def replay(path=None):
+    """Ledger vs inventory per (sku, hub), read from one consistent snapshot."""
+    conn = connect(path)
+    try:
+        conn.execute("BEGIN")
+        cp = conn.execute("SELECT id, log_id FROM ledger_checkpoints ORDER BY id DESC LIMIT 1").fetchone()
+        checkpoint_id, since = cp if cp else (None, 0)
+        opening = pd.read_sql_query("SELECT sku, hub, quantity AS opening FROM checkpoint_balances WHERE checkpoint_id = ?",
+                                    conn, params=(checkpoint_id,))
+        # Integers only (no action strings) keep the transfer out of SQLite cheap
+        sign_sql = " ".join(f"WHEN '{a}' THEN {s}" for a, s in SIGNS.items())
+        rows = conn.execute(f"""SELECT COALESCE(sku_id, 0), COALESCE(hub_id, 0),
+                                       CASE action {sign_sql} ELSE 0 END, COALESCE(qty, 0)
+                                FROM log_entries WHERE id > ?""", (since,)).fetchall()
+        log_id = conn.execute("SELECT COALESCE(MAX(id), ?) FROM log_entries", (since,)).fetchone()[0]
+        unknown = [r[0] for r in conn.execute(
+            f"SELECT DISTINCT action FROM log_entries WHERE id > ? AND action NOT IN ({','.join('?' * len(SIGNS))})",
+            (since, *SIGNS)).fetchall()] if rows else []
+        inventory = pd.read_sql_query("SELECT sku, hub, quantity AS inventory FROM inventory", conn)
+        skus = dict(conn.execute("SELECT id, name FROM dim_skus").fetchall())
+        hubs = dict(conn.execute("SELECT id, name FROM dim_hubs").fetchall())
+        conn.execute("COMMIT")
+    finally:
+        conn.close()
+
+    # One vectorized pass: sign each row, sum per integer (sku_id, hub_id), then decode names
+    moves = pd.DataFrame(np.array(rows, dtype=np.int64).reshape(-1, 4), columns=["sku_id", "hub_id", "sign", "qty"])
+    moves["signed"] = moves["sign"] * moves["qty"]
+    flows = moves.groupby(["sku_id", "hub_id"], sort=False)["signed"].sum().reset_index()
+    flows["sku"] = flows["sku_id"].map(skus)
+    flows["hub"] = flows["hub_id"].map(hubs)
+    flows = flows.dropna(subset=["sku", "hub"]).groupby(["sku", "hub"])["signed"].sum().rename("movements")
+
+    table = (opening.set_index(["sku", "hub"])["opening"].to_frame()
+             .join(flows, how="outer")
+             .join(inventory.set_index(["sku", "hub"])["inventory"], how="outer")
+             .fillna(0).astype(np.int64).reset_index())
+    table["ledger"] = table["opening"] + table["movements"]
+    table["difference"] = table["inventory"] - table["ledger"]
+    return {
+        "checkpoint_id": checkpoint_id,
+        "log_id": log_id,
+        "log_rows": len(moves),
+        "unknown_actions": sorted(a for a in unknown if a is not None),
+        "table": table[["sku", "hub", "opening", "movements", "ledger", "inventory", "difference"]],
+    }
+
+
+def post_corrections(result, user, run_id, path=None):
+    # Re-read each discrepant key inside the write transaction, counting movements logged
+    # since the replay, so concurrent stock updates never turn into a wrong correction.
+    wrong = result["table"][result["table"]["difference"] != 0]
+    keys = list(zip(wrong["sku"], wrong["hub"], wrong["ledger"]))
+
+    def tx(cur):
+        now = datetime.now().isoformat()
+        rows = []
+        for sku, h, ledger in keys:
+            late = cur.execute(
+                """SELECT COALESCE(SUM(CASE action WHEN 'OUT' THEN -qty WHEN 'IN' THEN qty WHEN 'COUNT' THEN qty ELSE 0 END), 0)
+                   FROM log_entries WHERE id > ? AND sku_id = (SELECT id FROM dim_skus WHERE name = ?)
+                   AND hub_id = (SELECT id FROM dim_hubs WHERE name = ?)""", (result["log_id"], sku, h)).fetchone()[0]
+            row = cur.execute("SELECT quantity FROM inventory WHERE sku=? AND hub=?", (sku, h)).fetchone()
+            diff = (row[0] if row else 0) - (int(ledger) + late)
+            if diff:
+                rows.append((now, user, sku, h, "COUNT", diff, f"Reconcile {run_id}"))
+        cur.executemany("INSERT INTO logs VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+        return len(rows)
+    return run_write(tx, path)
+
+
+def create_checkpoint(path=None, accept_inventory=False, note=""):
+    """Freeze the replayed ledger (or, with accept_inventory, the shelf counts) as the new opening balance."""
+    ensure_tables(path)
+    result = replay(path)
+    table = result["table"]
+    column = "inventory" if accept_inventory else "ledger"
+    balances = [(sku, h, int(q)) for sku, h, q in zip(table["sku"], table["hub"], table[column]) if q]
+
+    def tx(cur):
+        cp = cur.execute("INSERT INTO ledger_checkpoints (created_at, log_id, source, note) VALUES (?, ?, ?, ?)",
+                         (datetime.now().isoformat(), result["log_id"], column, note)).lastrowid
+        cur.executemany("INSERT INTO checkpoint_balances (checkpoint_id, sku, hub, quantity) VALUES (?, ?, ?, ?)",
+                        [(cp, *b) for b in balances])
+        return cp
+    return run_write(tx, path)
+
+
+def reconcile(fix=False, user="reconcile", trigger="manual", path=None):
+    ensure_tables(path)
+    start = time.perf_counter()
+    result = replay(path)
+    wrong = result["table"][result["table"]["difference"] != 0]
+    run_id = run_write(lambda cur: cur.execute(
+        "INSERT INTO reconciliation_runs (started_at, trigger, checkpoint_id, log_id, log_rows, discrepancies) VALUES (?, ?, ?, ?, ?, ?)",
+        (datetime.now().isoformat(), trigger, result["checkpoint_id"], result["log_id"], result["log_rows"], len(wrong))
+    ).lastrowid, path)
+    corrected = post_corrections(result, user, run_id, path) if fix and len(wrong) else 0
+    details = {"unknown_actions": result["unknown_actions"],
+               "discrepancies": wrong.head(REPORT_LIMIT).to_dict("records")}
+    seconds = round(time.perf_counter() - start, 3)
+    query("UPDATE reconciliation_runs SET corrected=?, seconds=?, details=? WHERE id=?",
+          (corrected, seconds, json.dumps(details, default=int), run_id), fetch=False, path=path)
+    return {"id": run_id, "log_rows": result["log_rows"], "discrepancies": wrong, "corrected": corrected,
+            "seconds": seconds, "unknown_actions": result["unknown_actions"]}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Reconcile inventory against the logs ledger.")
+    parser.add_argument("--fix", action="store_true", help="Post COUNT entries so the ledger matches inventory")
+    parser.add_argument("--user", default="reconcile", help="Username recorded on correcting entries")
+    parser.add_argument("--checkpoint", action="store_true", help="Save the current ledger as the new opening balance")
+    parser.add_argument("--accept-inventory", action="store_true",
+                        help="With --checkpoint: take today's inventory as the opening balance")
+    parser.add_argument("--csv", help="Write all discrepancies to this CSV file")
+    args = parser.parse_args()
+    if args.checkpoint:
+        cp = create_checkpoint(accept_inventory=args.accept_inventory, note="cli")
+        print(f"📌 Checkpoint {cp} saved ({'inventory' if args.accept_inventory else 'ledger'} balances, {DB})")
+        raise SystemExit(0)
+    result = reconcile(fix=args.fix, user=args.user)
+    wrong = result["discrepancies"]
+    print(f"🧾 Reconciliation run {result['id']}: {result['log_rows']} log rows replayed in {result['seconds']}s")
+    print(f"   {len(wrong)} discrepancies, {result['corrected']} corrected")
+    if result["unknown_actions"]:
+        print(f"   ⚠️ Ignored actions: {', '.join(result['unknown_actions'])}")
+    if len(wrong):
+        print(wrong.head(20).to_string(index=False))
+    if args.csv:
+        wrong.to_csv(args.csv, index=False)
+    raise SystemExit(1 if len(wrong) and not args.fix else 0)
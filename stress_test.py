@@ -0,0 +1,101 @@
+import argparse
+import multiprocessing as mp
+import random
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+import db
+
+# Local multi-process stress test for the shared-database deployment mode.
+# Every operation is a read-modify-write stock movement plus its log entry, the
+# same shape as "Update Stock"; at the end the totals must add up exactly.
+
+
+def _worker(path, threads, ops, use_queue, seed, out):
+    db.DB = Path(path)
+    db.WRITE_QUEUE = use_queue
+    db.metrics = db.LockMetrics(window=threads * ops)
+    rows = db.query("SELECT sku, hub FROM inventory")
+    done, errors = [0], []
+    lock = threading.Lock()
+
+    def move(cur, sku, hub):
+        qty = cur.execute("SELECT quantity FROM inventory WHERE sku=? AND hub=?", (sku, hub)).fetchone()[0]
+        cur.execute("UPDATE inventory SET quantity=? WHERE sku=? AND hub=?", (qty + 1, sku, hub))
+        cur.execute("INSERT INTO logs VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (datetime.now().isoformat(), "stress", sku, hub, "IN", 1, "stress test"))
+
+    def run(n):
+        rnd = random.Random(seed * 1000 + n)
+        for _ in range(ops):
+            sku, hub = rnd.choice(rows)
+            try:
+                db.run_write(lambda cur: move(cur, sku, hub))
+                with lock:
+                    done[0] += 1
+            except sqlite3.OperationalError as e:
+                with lock:
+                    errors.append(str(e))
+
+    pool = [threading.Thread(target=run, args=(n,)) for n in range(threads)]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    m = db.metrics
+    out.put({"done": done[0], "errors": errors, "waits": list(m._waits),
+             "retries": m.retries, "failures": m.failures})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Hammer a copy of the inventory database from several processes.")
+    parser.add_argument("--db", default=str(db.DB), help="Database to copy for the test")
+    parser.add_argument("--procs", type=int, default=4)
+    parser.add_argument("--threads", type=int, default=4, help="Threads per process")
+    parser.add_argument("--ops", type=int, default=100, help="Writes per thread")
+    parser.add_argument("--queue", action="store_true", help="Use the single-writer queue in each process")
+    args = parser.parse_args()
+
+    tmp = Path(tempfile.mkdtemp(prefix="kiss-stress-"))
+    path = tmp / "stress.db"
+    shutil.copy(args.db, path)
+    before_qty = db.query("SELECT COALESCE(SUM(quantity), 0) FROM inventory", path=path)[0][0]
+    before_logs = db.query("SELECT COUNT(*) FROM logs", path=path)[0][0]
+
+    out = mp.Queue()
+    start = time.perf_counter()
+    procs = [mp.Process(target=_worker, args=(str(path), args.threads, args.ops, args.queue, i, out))
+             for i in range(args.procs)]
+    for p in procs:
+        p.start()
+    results = [out.get() for _ in procs]
+    for p in procs:
+        p.join()
+    elapsed = time.perf_counter() - start
+
+    done = sum(r["done"] for r in results)
+    errors = [e for r in results for e in r["errors"]]
+    waits = sorted(w for r in results for w in r["waits"])
+    pct = lambda p: waits[min(len(waits) - 1, int(p * len(waits)))] * 1000 if waits else 0.0
+    after_qty = db.query("SELECT COALESCE(SUM(quantity), 0) FROM inventory", path=path)[0][0]
+    after_logs = db.query("SELECT COUNT(*) FROM logs", path=path)[0][0]
+
+    print(f"== Stress test: {args.procs} procs x {args.threads} threads x {args.ops} ops"
+          f"{' (writer queue)' if args.queue else ''} ==")
+    print(f"Committed: {done} in {elapsed:.2f}s ({done / elapsed:.0f} writes/s)")
+    print(f"Lock errors: {len(errors)}  Retries: {sum(r['retries'] for r in results)}")
+    print(f"Lock wait ms: p50={pct(0.5):.2f} p95={pct(0.95):.2f} p99={pct(0.99):.2f} max={pct(1.0):.2f}")
+    consistent = after_qty - before_qty == done and after_logs - before_logs == done
+    print("✅ Inventory and logs consistent" if consistent else
+          f"❌ Mismatch: qty +{after_qty - before_qty}, logs +{after_logs - before_logs}, committed {done}")
+    shutil.rmtree(tmp, ignore_errors=True)
+    raise SystemExit(0 if consistent and not errors else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+import hashlib
+import os
+import re
+from pathlib import Path
+
+from db import DB, query, read_once, run_write
+
+# Multi-tenant mode: set KISS_TENANT_DIR and every business gets its own database file
+# <dir>/<tenant>.db. Without it the app runs single-tenant on DB exactly as before.
+TENANT_DIR = Path(os.environ["KISS_TENANT_DIR"]) if os.environ.get("KISS_TENANT_DIR") else None
+MULTI_TENANT = TENANT_DIR is not None
+DEFAULT_HUBS = [("Hub 1", "Hub"), ("Hub 2", "Hub"), ("Hub 3", "Hub"), ("Retail", "Retail")]
+_NAME = re.compile(r"^[a-z0-9][a-z0-9_-]{0,62}$")
+
+
+def tenant_path(name):
+    """Database file for a tenant, or None if the name is invalid or the tenant doesn't exist."""
+    name = (name or "").strip().lower()
+    if not MULTI_TENANT or not _NAME.match(name):
+        return None
+    path = TENANT_DIR / f"{name}.db"
+    return path if path.exists() else None
+
+
+def database_paths(requires=None):
+    """Every database background jobs should visit: all tenant files, or just DB.
+
+    With requires, tenants nobody has logged into yet (so not migrated) are skipped.
+    """
+    if not MULTI_TENANT:
+        return [DB]
+    paths = sorted(TENANT_DIR.glob("*.db")) if TENANT_DIR.exists() else []
+    if requires:
+        paths = [p for p in paths if read_once("SELECT 1 FROM sqlite_master WHERE name=?", (requires,), p)]
+    return paths
+
+
+def ensure_hubs_table(path=None, seed=DEFAULT_HUBS):
+    # kind is "Hub" (hub managers) or "Retail"; position keeps the pickers in a stable order
+    query("""CREATE TABLE IF NOT EXISTS hubs (
+        name TEXT PRIMARY KEY,
+        kind TEXT DEFAULT 'Hub',
+        position INTEGER)""", fetch=False, path=path)
+    if seed and not query("SELECT 1 FROM hubs LIMIT 1", path=path):
+        add_hubs(seed, path)
+
+
+def add_hubs(hubs, path=None):
+    def tx(cur):
+        start = cur.execute("SELECT COALESCE(MAX(position), 0) FROM hubs").fetchone()[0]
+        cur.executemany("INSERT OR IGNORE INTO hubs (name, kind, position) VALUES (?, ?, ?)",
+                        [(name, kind, start + i + 1) for i, (name, kind) in enumerate(hubs)])
+    run_write(tx, path)
+
+
+def hub_names(kind=None, path=None):
+    if kind:
+        return [r[0] for r in query("SELECT name FROM hubs WHERE kind=? ORDER BY position", (kind,), path=path)]
+    return [r[0] for r in query("SELECT name FROM hubs ORDER BY position", path=path)]
+
+
+def init_tenant(name, hubs, admin, password):
+    """Create a tenant database with its hubs and first admin; the app migrates the rest on first login."""
+    name = name.strip().lower()
+    if not MULTI_TENANT:
+        raise SystemExit("Set KISS_TENANT_DIR to use tenants.")
+    if not _NAME.match(name):
+        raise SystemExit(f"Invalid tenant name: {name!r} (use a-z, 0-9, '-' and '_')")
+    TENANT_DIR.mkdir(parents=True, exist_ok=True)
+    path = TENANT_DIR / f"{name}.db"
+    if path.exists():
+        raise SystemExit(f"Tenant already exists: {path}")
+    query("""CREATE TABLE IF NOT EXISTS users (
+        username TEXT PRIMARY KEY,
+        password TEXT,
+        role TEXT,
+        hub TEXT)""", fetch=False, path=path)
+    ensure_hubs_table(path, seed=hubs)
+    query("INSERT INTO users (username, password, role, hub) VALUES (?, ?, 'Admin', 'HQ')",
+          (admin, hashlib.sha256(password.encode()).hexdigest()), fetch=False, path=path)
+    return path
@@ -0,0 +1,57 @@
+import os
+import shutil
+import sqlite3
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+# No background threads during tests
+os.environ["KISS_MAINTENANCE_SCHEDULER"] = "0"
+os.environ["KISS_NOTIFIER"] = "0"
+
+import db  # noqa: E402
+
+APP = str(ROOT / "app.py")
+
+
+def run_app(**session):
+    from streamlit.testing.v1 import AppTest
+    at = AppTest.from_file(APP, default_timeout=120)
+    for key, value in session.items():
+        at.session_state[key] = value
+    return at.run()
+
+
+@pytest.fixture(scope="session")
+def template_db(tmp_path_factory):
+    """A database set up (tables, triggers, seed data) by the app itself, created once."""
+    path = tmp_path_factory.mktemp("template") / "ttt_inventory.db"
+    saved, db.DB = db.DB, path
+    try:
+        at = run_app()
+        assert not at.exception
+    finally:
+        db.DB = saved
+        db.pool.close(path)
+    with sqlite3.connect(path) as conn:
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    return path
+
+
+@pytest.fixture
+def app_db(template_db, tmp_path, monkeypatch):
+    """A private copy of the template that the app and db.query() use for this test."""
+    path = tmp_path / "ttt_inventory.db"
+    shutil.copy(template_db, path)
+    monkeypatch.setattr(db, "DB", path)
+    yield path
+    db.pool.close(path)
+
+
+def login(username, **session):
+    """Run the app as an already logged-in user."""
+    row = db.query("SELECT username, role, hub FROM users WHERE username=?", (username,))
+    return run_app(user=row[0], **session)
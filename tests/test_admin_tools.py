@@ -0,0 +1,32 @@
+import admin_tools
+from db import query
+
+
+def write_csv(path, text):
+    path.write_text(text)
+    return str(path)
+
+
+def test_import_users_counts_rows_not_trigger_writes(app_db, tmp_path, capsys):
+    csv_path = write_csv(tmp_path / "users.csv",
+                         "username,password,role,hub\nann,pw,Hub Manager,Hub 1\nbea,pw,Retail,Retail\n,nopw,Retail,Retail\n")
+    assert admin_tools.import_users(csv_path) == (2, 1)
+    assert "2 applied, 1 skipped" in capsys.readouterr().out
+    assert admin_tools.import_users(csv_path) == (0, 3)  # already there, not updated
+    assert admin_tools.import_users(csv_path, update=True) == (2, 1)
+    assert query("SELECT username FROM users WHERE username IN ('ann', 'bea') ORDER BY username") == [("ann",), ("bea",)]
+
+
+def test_import_users_dry_run_writes_nothing(app_db, tmp_path):
+    csv_path = write_csv(tmp_path / "users.csv", "username,password\ncat,pw\n")
+    assert admin_tools.import_users(csv_path, dry_run=True) == (1, 0)
+    assert query("SELECT 1 FROM users WHERE username='cat'") == []
+
+
+def test_import_skus_defaults_to_the_retail_stores(app_db, tmp_path):
+    query("UPDATE hubs SET name='Store A' WHERE kind='Retail'", fetch=False)
+    query("INSERT INTO hubs (name, kind, position) VALUES ('Store B', 'Retail', 99)", fetch=False)
+    csv_path = write_csv(tmp_path / "skus.csv", "sku,product_name\nNew Sock,New Sock\n")
+    assert admin_tools.import_skus(csv_path) == (1, 0)
+    assert query("SELECT assigned_hubs FROM sku_info WHERE sku='New Sock'") == [("Store A,Store B",)]
+    assert query("SELECT hub FROM inventory WHERE sku='New Sock' ORDER BY hub") == [("Store A",), ("Store B",)]
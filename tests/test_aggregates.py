@@ -0,0 +1,73 @@
+import random
+
+from conftest import login
+from db import query, run_write
+
+# Trigger-maintained tables and the order to compare them in
+AGGREGATES = {
+    "throughput_daily": "day, hub",
+    "sku_daily": "day, hub, sku",
+    "shipment_lead_times": "shipment_id",
+    "hub_counters": "hub",
+    "user_counters": "username",
+    "message_threads": "thread",
+}
+
+
+def snapshot():
+    return {t: query(f"SELECT * FROM {t} ORDER BY {order}") for t, order in AGGREGATES.items()}
+
+
+def random_activity(seed=7, steps=300):
+    rng = random.Random(seed)
+    skus = [r[0] for r in query("SELECT sku FROM sku_info LIMIT 20")]
+    hubs = ["Hub 1", "Hub 2", "Hub 3", "Retail"]
+    users = ["kevin", "fox", "slo", "carmen", "smooth"]
+
+    def tx(cur):
+        for i in range(steps):
+            sku, h, user = rng.choice(skus), rng.choice(hubs), rng.choice(users)
+            day = f"2025-0{rng.randint(1, 3)}-1{rng.randint(0, 9)}T10:00:00"
+            step = rng.randrange(6)
+            if step == 0:
+                cur.execute("INSERT OR REPLACE INTO inventory (sku, hub, quantity) VALUES (?, ?, ?)", (sku, h, rng.randint(0, 30)))
+            elif step == 1:
+                cur.execute("UPDATE inventory SET quantity = ? WHERE sku=? AND hub=?", (rng.randint(0, 30), sku, h))
+            elif step == 2:
+                verb = rng.choice(["INSERT", "INSERT OR REPLACE"])  # the latter is what Restore runs
+                cur.execute(f"{verb} INTO logs VALUES (?, ?, ?, ?, ?, ?, ?)",
+                            (day, user, sku, h, rng.choice(["IN", "OUT", "COUNT"]), rng.randint(1, 9), ""))
+            elif step == 3:
+                cur.execute("INSERT INTO shipments (supplier, tracking, carrier, hub, skus, date, status) VALUES (?, ?, ?, ?, ?, ?, 'Pending')",
+                            ("angie", f"T{i}", "UPS", h, f"{sku} x 2", "2025-01-01"))
+            elif step == 4:
+                row = cur.execute("SELECT id, hub FROM shipments WHERE status='Pending' ORDER BY random() LIMIT 1").fetchone()
+                if row:
+                    cur.execute("UPDATE shipments SET status='Received' WHERE id=?", (row[0],))
+                    for verb in ["INSERT", rng.choice(["INSERT", "INSERT OR REPLACE"])]:  # a later re-import too
+                        cur.execute(f"{verb} INTO logs VALUES (?, ?, ?, ?, 'IN', 2, ?)",
+                                    (day if verb == "INSERT" else "2025-04-01T10:00:00", user, sku, row[1], f"Shipment {row[0]}"))
+            else:
+                cur.execute("INSERT INTO messages (sender, receiver, message, thread, timestamp) VALUES (?, ?, ?, ?, ?)",
+                            (user, rng.choice(users), "hi", f"thread {rng.randint(1, 8)}", f"{day}.{i:06d}"))
+    run_write(tx)
+
+
+def test_trigger_maintained_aggregates_match_a_full_rebuild(app_db):
+    random_activity()
+    live = snapshot()
+    assert all(live.values())
+    at = login("kevin")
+    at.sidebar.radio[0].set_value("Dashboard").run()
+    at.button(key="btn_rebuild_aggregates").click().run()
+    assert not at.exception
+    assert snapshot() == live
+
+
+def test_sidebar_badges_follow_inventory(app_db):
+    query("UPDATE inventory SET quantity = 0 WHERE hub='Hub 2'", fetch=False)
+    query("UPDATE inventory SET quantity = 50 WHERE hub='Hub 2' AND sku='Black Solid'", fetch=False)
+    skus = query("SELECT COUNT(*) FROM inventory WHERE hub='Hub 2'")[0][0]
+    at = login("fox")
+    badges = " ".join(m.value for m in at.sidebar.markdown)
+    assert f"Low Stock: **{skus - 1}**" in badges and "On Hand: **50**" in badges
@@ -0,0 +1,70 @@
+import pytest
+
+pa = pytest.importorskip("pyarrow")
+import pyarrow.ipc as ipc  # noqa: E402
+import pyarrow.parquet as pq  # noqa: E402
+
+import analytics_export  # noqa: E402
+from db import run_write  # noqa: E402
+
+LOGS = [
+    ("2025-01-05T10:00:00", "kevin", "Black Solid", "Hub 1", "IN", 5, ""),
+    ("2025-02-01T09:30:00.250000", "kevin", "Black Solid", "Hub 2", "OUT", 2, ""),
+    ("2025-02-03 08:00:00", "fox", "Black Solid", "Hub 2", "IN", 7, ""),  # parsed, raw text kept
+    ("last tuesday", "fox", "Black Solid", "Hub 2", "IN", 3, ""),  # unparseable: ts is NULL
+    (None, "fox", "Black Solid", "Hub 3", "OUT", 1, ""),
+]
+
+
+def add_logs(rows):
+    run_write(lambda cur: cur.executemany("INSERT INTO logs VALUES (?, ?, ?, ?, ?, ?, ?)", rows))
+
+
+def arrow_daily(app_db, dest):
+    analytics_export.export_arrow(dest, db=app_db)
+    return ipc.open_file(pa.memory_map(str(dest / "daily.arrow"))).read_all()
+
+
+def totals(table):
+    return sorted(zip(table.column("action").to_pylist(), table.column("units").to_pylist()))
+
+
+def test_parquet_daily_matches_arrow_including_null_timestamps(app_db, tmp_path):
+    add_logs(LOGS)
+    analytics_export.export_parquet(tmp_path / "pq", db=app_db)
+    daily = pq.read_table(tmp_path / "pq" / "daily")
+    assert sum(daily.column("units").to_pylist()) == sum(r[5] for r in LOGS)
+    assert totals(daily) == totals(arrow_daily(app_db, tmp_path / "arrow"))
+
+
+def test_incremental_run_only_adds_new_rows(app_db, tmp_path):
+    add_logs(LOGS[:2])
+    analytics_export.export_parquet(tmp_path, db=app_db)
+    add_logs(LOGS[2:])
+    summary = analytics_export.export_parquet(tmp_path, db=app_db)
+    assert summary["logs"] == len(LOGS) - 2
+    assert pq.read_table(tmp_path / "logs").num_rows == len(LOGS)
+    assert totals(pq.read_table(tmp_path / "daily")) == totals(arrow_daily(app_db, tmp_path / "arrow"))
+
+
+def test_retry_after_interrupted_run_writes_no_duplicates(app_db, tmp_path, monkeypatch):
+    add_logs(LOGS * 4)
+    batches = analytics_export._batches
+    monkeypatch.setattr(analytics_export, "_batches", lambda conn, sql, params=(): batches(conn, sql, params, size=3))
+    save_state, calls = analytics_export._save_state, []
+
+    def crash_on_second_save(dest, state):
+        calls.append(1)
+        if len(calls) == 2:  # batch 2's files are in place, its state is not
+            raise KeyboardInterrupt
+        save_state(dest, state)
+
+    monkeypatch.setattr(analytics_export, "_save_state", crash_on_second_save)
+    with pytest.raises(KeyboardInterrupt):
+        analytics_export.export_parquet(tmp_path, db=app_db)
+    monkeypatch.setattr(analytics_export, "_save_state", save_state)
+    analytics_export.export_parquet(tmp_path, db=app_db)
+
+    assert pq.read_table(tmp_path / "logs").num_rows == len(LOGS) * 4
+    assert sum(pq.read_table(tmp_path / "daily").column("units").to_pylist()) == sum(r[5] for r in LOGS) * 4
+    assert not list(tmp_path.rglob("*.tmp"))
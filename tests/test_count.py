@@ -0,0 +1,19 @@
+from conftest import login
+from db import query
+
+
+def test_posting_a_count_reports_the_adjustments_it_wrote(app_db):
+    at = login("fox")
+    at.sidebar.radio[0].set_value("Count").run()
+    at.button(key="btn_start_count").click().run()
+    session_id = query("SELECT id FROM count_sessions WHERE status='Open'")[0][0]
+    lines = query("SELECT sku, system_qty FROM count_lines WHERE session_id=? ORDER BY sku", (session_id,))
+    # Three SKUs counted off by one, one counted exactly
+    at.session_state[f"count_grid_{session_id}"] = {
+        "edited_rows": {i: {"Counted": qty + (1 if i < 3 else 0)} for i, (_, qty) in enumerate(lines[:4])},
+        "added_rows": [], "deleted_rows": []}
+    at.run()
+    at.button(key="btn_post_count").click().run()
+    assert not at.exception
+    assert "Count posted: 3 adjustments." in [s.value for s in at.success]
+    assert query("SELECT COUNT(*) FROM logs WHERE action='COUNT' AND comment=?", (f"Count {session_id}",)) == [(3,)]
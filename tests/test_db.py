@@ -0,0 +1,43 @@
+import sqlite3
+import threading
+import time
+
+import pytest
+
+import db
+
+
+def hold_write_lock(path, seconds):
+    conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+    conn.execute("BEGIN IMMEDIATE")
+    timer = threading.Timer(seconds, lambda: (conn.execute("COMMIT"), conn.close()))
+    timer.start()
+    return timer
+
+
+@pytest.fixture
+def scratch(tmp_path):
+    path = tmp_path / "scratch.db"
+    db.query("CREATE TABLE t (x INTEGER)", fetch=False, path=path)
+    yield path
+    db.pool.close(path)
+
+
+def test_write_waits_out_a_lock_longer_than_the_backoff_steps(scratch):
+    # More than the old fixed 10 attempts (~1.5 s) of backoff, well inside the deadline
+    timer = hold_write_lock(scratch, 2.0)
+    start = time.perf_counter()
+    db.run_write(lambda cur: cur.execute("INSERT INTO t VALUES (1)"), scratch)
+    timer.join()
+    assert time.perf_counter() - start >= 1.5
+    assert db.query("SELECT x FROM t", path=scratch) == [(1,)]
+
+
+def test_write_gives_up_at_the_deadline(scratch, monkeypatch):
+    monkeypatch.setattr(db, "WRITE_TIMEOUT", 0.3)
+    timer = hold_write_lock(scratch, 1.5)
+    start = time.perf_counter()
+    with pytest.raises(sqlite3.OperationalError, match="locked"):
+        db.run_write(lambda cur: cur.execute("INSERT INTO t VALUES (1)"), scratch)
+    assert time.perf_counter() - start < 1.0
+    timer.join()
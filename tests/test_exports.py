@@ -0,0 +1,75 @@
+import sqlite3
+from contextlib import closing
+
+import db
+import exports
+from db import query
+
+
+def test_artifact_is_rebuilt_only_after_its_tables_change(app_db, tmp_path, monkeypatch):
+    monkeypatch.setattr(exports, "EXPORT_DIR", tmp_path / "exports")
+    builds = []
+
+    def build():
+        builds.append(1)
+        return repr(query("SELECT sku, hub, quantity FROM inventory ORDER BY sku, hub")).encode()
+
+    first = exports.get_artifact("inventory", (), ("inventory",), build)
+    assert exports.get_artifact("inventory", (), ("inventory",), build) == first
+    query("INSERT INTO messages (sender, receiver, message, thread, timestamp) VALUES ('a', 'b', 'c', 'd', 'e')", fetch=False)
+    assert exports.peek("inventory", (), ("inventory",)) == first  # unrelated table
+    query("UPDATE inventory SET quantity = quantity + 1 WHERE sku='Black Solid' AND hub='Hub 2'", fetch=False)
+    assert exports.peek("inventory", (), ("inventory",)) is None
+    assert exports.get_artifact("inventory", (), ("inventory",), build) != first
+    assert len(builds) == 2
+
+
+def test_disk_cache_is_private_and_skips_backups(app_db, tmp_path, monkeypatch):
+    folder = tmp_path / "exports"
+    monkeypatch.setattr(exports, "EXPORT_DIR", folder)
+    exports.get_artifact("private", (), ("inventory",), lambda: b"data")
+    exports.get_artifact("backup", ("users",), ("users",), lambda: b"hashes", disk=False)
+    files = list(folder.glob("*.bin"))
+    assert len(files) == 1 and files[0].read_bytes() == b"data"
+    assert folder.stat().st_mode & 0o777 == 0o700
+    assert files[0].stat().st_mode & 0o777 == 0o600
+
+
+def test_foreign_export_dir_is_not_used(app_db, tmp_path, monkeypatch):
+    target = tmp_path / "elsewhere"
+    target.mkdir()
+    (tmp_path / "link").symlink_to(target)
+    monkeypatch.setattr(exports, "EXPORT_DIR", tmp_path / "link")
+    assert exports.get_artifact("foreign", (), ("inventory",), lambda: b"data") == b"data"
+    assert not list(target.iterdir())
+
+
+def _copy_database(source, target):
+    with closing(sqlite3.connect(source)) as src, closing(sqlite3.connect(target)) as dst:
+        src.backup(dst)
+
+
+def test_restored_database_does_not_match_newer_artifacts(app_db, tmp_path, monkeypatch):
+    monkeypatch.setattr(exports, "EXPORT_DIR", tmp_path / "exports")
+
+    def build():
+        return repr(query("SELECT sku, hub, quantity FROM inventory ORDER BY sku, hub")).encode()
+
+    _copy_database(app_db, tmp_path / "backup.db")
+    query("UPDATE inventory SET quantity = quantity + 1 WHERE sku='Black Solid' AND hub='Hub 2'", fetch=False)
+    newer = exports.get_artifact("inventory", (), ("inventory",), build)
+    _copy_database(tmp_path / "backup.db", app_db)
+    query("UPDATE inventory SET quantity = quantity + 5 WHERE sku='Black Solid' AND hub='Hub 2'", fetch=False)
+    assert exports.peek("inventory", (), ("inventory",)) is None
+    assert exports.get_artifact("inventory", (), ("inventory",), build) != newer
+
+
+def test_each_database_gets_its_own_id(app_db, tmp_path):
+    other = tmp_path / "other.db"
+    sqlite3.connect(other).close()
+    for table in exports.VERSIONED.values():
+        query(f"CREATE TABLE {table} (x)", fetch=False, path=other)
+    exports.ensure_tables(other)
+    exports.ensure_tables(other)
+    assert exports.versions("_db_id", path=other) != exports.versions("_db_id")
+    db.pool.close(other)
@@ -0,0 +1,38 @@
+import sqlite3
+
+from conftest import login, run_app
+from db import query
+
+
+def decoded():
+    return query("SELECT user, sku, hub, action, qty FROM logs ORDER BY timestamp")
+
+
+def test_restoring_logs_keeps_dictionary_ids(app_db):
+    query("INSERT INTO logs VALUES ('2025-01-01T10:00:00', 'kevin', 'Black Solid', 'Hub 2', 'IN', 5, '')", fetch=False)
+    ids = query("SELECT (SELECT id FROM dim_skus WHERE name='Black Solid'), (SELECT id FROM dim_hubs WHERE name='Hub 2')")
+    # What Admin → Restore runs for every CSV row
+    query("INSERT OR REPLACE INTO logs (timestamp, user, sku, hub, action, qty, comment) VALUES (?, ?, ?, ?, ?, ?, ?)",
+          ("2025-01-02T10:00:00", "kevin", "Black Solid", "Hub 2", "OUT", 2, "restored"), fetch=False)
+    assert query("SELECT (SELECT id FROM dim_skus WHERE name='Black Solid'), (SELECT id FROM dim_hubs WHERE name='Hub 2')") == ids
+    assert decoded() == [("kevin", "Black Solid", "Hub 2", "IN", 5), ("kevin", "Black Solid", "Hub 2", "OUT", 2)]
+
+
+def test_logs_page_shows_restored_and_earlier_rows(app_db):
+    query("INSERT INTO logs VALUES ('2025-01-01T10:00:00', 'fox', 'Black Solid', 'Hub 2', 'IN', 5, '')", fetch=False)
+    query("INSERT OR REPLACE INTO logs VALUES ('2025-01-02T10:00:00', 'fox', 'Black Solid', 'Hub 2', 'OUT', 2, '')", fetch=False)
+    at = login("kevin")
+    at.sidebar.radio[0].set_value("Logs").run()
+    assert not at.exception
+    shown = next(d.value for d in at.dataframe if "Comment" in d.value.columns)
+    assert shown["SKU"].tolist() == ["Black Solid", "Black Solid"]
+    assert shown["Hub"].notna().all() and shown["User"].notna().all()
+
+
+def test_old_trigger_is_replaced_on_startup(app_db):
+    with sqlite3.connect(app_db) as conn:
+        sql = conn.execute("SELECT sql FROM sqlite_master WHERE name='trg_logs_insert'").fetchone()[0]
+        conn.execute("DROP TRIGGER trg_logs_insert")
+        conn.execute(sql.replace("INSERT INTO dim_", "INSERT OR IGNORE INTO dim_"))
+    run_app()
+    assert "OR IGNORE" not in query("SELECT sql FROM sqlite_master WHERE name='trg_logs_insert'")[0][0]
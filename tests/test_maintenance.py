@@ -0,0 +1,16 @@
+import maintenance
+from conftest import login
+
+
+def test_empty_task_list_runs_nothing(app_db):
+    result = maintenance.run_maintenance([])
+    assert result["status"] == "OK" and result["details"] == {}
+    assert set(maintenance.run_maintenance(["checkpoint"])["details"]) == {"checkpoint"}
+
+
+def test_run_button_needs_a_task(app_db):
+    at = login("kevin")
+    at.sidebar.radio[0].set_value("Maintenance").run()
+    assert not at.button(key="btn_run_maintenance").disabled
+    at.multiselect(key="maint_tasks").set_value([]).run()
+    assert at.button(key="btn_run_maintenance").disabled
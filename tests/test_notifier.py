@@ -0,0 +1,24 @@
+import notifier
+from conftest import login
+from db import query
+
+
+def test_notifications_come_from_an_existing_user_nobody_can_log_in_as(app_db):
+    assert query("SELECT role FROM users WHERE username=?", (notifier.SENDER,)) == [("System",)]
+    at = login("kevin")
+    at.sidebar.radio[0].set_value("Messages").run()
+    assert notifier.SENDER not in at.selectbox(key="message_recipient").options
+
+
+def test_replies_to_a_notification_reach_hq(app_db):
+    query("UPDATE inventory SET quantity=20 WHERE sku='Black Solid' AND hub='Hub 2'", fetch=False)
+    query("UPDATE inventory SET quantity=3 WHERE sku='Black Solid' AND hub='Hub 2'", fetch=False)  # crosses low stock
+    assert notifier.drain() >= 1
+    thread = query("SELECT thread FROM messages WHERE sender=? AND receiver='fox'", (notifier.SENDER,))[0][0]
+    at = login("fox")
+    at.sidebar.radio[0].set_value("Messages").run()
+    at.text_input(key=f"reply_input_{thread}").set_value("on it")
+    at.button(key=f"reply_btn_{thread}").click().run()
+    assert not at.exception
+    receiver = query("SELECT receiver FROM messages WHERE sender='fox' AND message='on it'")[0][0]
+    assert query("SELECT role FROM users WHERE username=?", (receiver,)) == [("Admin",)]
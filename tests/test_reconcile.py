@@ -0,0 +1,15 @@
+import reconcile
+from db import query
+
+
+def test_fix_posts_corrections_and_the_next_run_is_clean(app_db):
+    query("INSERT INTO logs VALUES ('2025-01-01T10:00:00', 'fox', 'Black Solid', 'Hub 2', 'IN', 5, '')", fetch=False)
+    reconcile.create_checkpoint(accept_inventory=True)
+    query("UPDATE inventory SET quantity = quantity + 4 WHERE sku='Black Solid' AND hub='Hub 2'", fetch=False)  # off the books
+
+    result = reconcile.reconcile(fix=True, user="kevin")
+    assert result["discrepancies"][["sku", "hub", "difference"]].values.tolist() == [["Black Solid", "Hub 2", 4]]
+    assert result["corrected"] == 1
+    assert query("SELECT user, action, qty, comment FROM logs WHERE comment LIKE 'Reconcile %'") == \
+        [("kevin", "COUNT", 4, f"Reconcile {result['id']}")]
+    assert len(reconcile.reconcile()["discrepancies"]) == 0
@@ -0,0 +1,44 @@
+from conftest import login
+from db import query
+
+
+def scan(at, *codes):
+    for code in codes:
+        at.text_input(key="scan_code").set_value(code).run()
+        assert not at.exception
+    return at
+
+
+def scan_page(action="IN"):
+    at = login("fox")  # Hub Manager, Hub 2
+    at.sidebar.radio[0].set_value("Scan").run()
+    at.radio(key="scan_action_radio").set_value(action).run()
+    return at
+
+
+def test_repeated_scans_are_aggregated(app_db):
+    query("INSERT INTO sku_barcodes (code, sku) VALUES ('0001', 'Black Solid')", fetch=False)
+    at = scan(scan_page(), "0001", "Black Solid", "0001")
+    assert at.session_state["scan_buffer"] == {"Black Solid": 3}
+    assert at.session_state["scan_count"] == 3
+    at.button(key="btn_commit_scans").click().run()
+    assert query("SELECT quantity FROM inventory WHERE sku='Black Solid' AND hub='Hub 2'") == [(3,)]
+    assert query("SELECT action, qty FROM logs WHERE user='fox'") == [("IN", 3)]
+
+
+def test_unknown_code_is_not_buffered(app_db):
+    at = scan(scan_page(), "no-such-code", "Black")  # Black is a Hub 1 SKU
+    assert at.session_state["scan_buffer"] == {}
+    assert at.session_state["scan_note"] == "❌ Unknown code for Hub 2: Black"
+
+
+def test_failed_out_stays_buffered_without_retriggering(app_db):
+    at = scan_page("OUT")
+    scan(at, *["Black Solid"] * 50)  # the 50th scan auto-commits, with no stock to take out
+    assert at.session_state["scan_buffer"] == {"Black Solid": -50}
+    assert any("Not enough 'Black Solid'" in w.value for w in at.warning)
+    at.radio(key="scan_action_radio").set_value("IN").run()
+    scan(at, "Black and Orange Stripes")
+    assert at.session_state["scan_buffer"] == {"Black Solid": -50, "Black and Orange Stripes": 1}
+    assert at.session_state["scan_count"] == 1
+    assert query("SELECT COUNT(*) FROM logs WHERE user='fox'") == [(0,)]
@@ -0,0 +1,47 @@
+import sqlite3
+
+import reconcile
+from conftest import login, run_app
+from db import query
+
+
+def sku_id(name):
+    return query("SELECT id FROM dim_skus WHERE name=?", (name,))[0][0]
+
+
+def test_restoring_sku_info_keeps_sku_ids(app_db):
+    query("INSERT INTO logs VALUES ('2025-01-01T10:00:00', 'fox', 'Black Solid', 'Hub 2', 'IN', 7, '')", fetch=False)
+    before, ledger = sku_id("Black Solid"), reconcile.replay()["table"]
+    # What Admin → Restore (and seed_all_skus) run for sku_info rows
+    query("INSERT OR REPLACE INTO sku_info (sku, product_name, assigned_hubs) VALUES (?, ?, ?)",
+          ("Black Solid", "Black Solid", "Hub 1,Hub 2,Hub 3,Retail"), fetch=False)
+    assert sku_id("Black Solid") == before
+    assert query("SELECT sku FROM logs") == [("Black Solid",)]
+    assert reconcile.replay()["table"].equals(ledger)
+
+
+def test_search_finds_restored_sku(app_db):
+    query("INSERT OR REPLACE INTO sku_info (sku, product_name, assigned_hubs) VALUES (?, ?, ?)",
+          ("Black Solid", "Black Solid", "Hub 1,Hub 2,Hub 3,Retail"), fetch=False)
+    at = login("kevin", global_search="black solid")
+    assert any("Black Solid" in m.value for m in at.markdown)
+
+
+def test_old_sku_search_triggers_are_replaced_on_startup(app_db):
+    with sqlite3.connect(app_db) as conn:
+        for name in ("trg_search_sku_info_ins", "trg_search_sku_info_upd"):
+            sql = conn.execute("SELECT sql FROM sqlite_master WHERE name=?", (name,)).fetchone()[0]
+            conn.execute(f"DROP TRIGGER {name}")
+            conn.execute(sql.replace("INSERT INTO dim_skus", "INSERT OR IGNORE INTO dim_skus"))
+    run_app()
+    assert not query("SELECT name FROM sqlite_master WHERE name LIKE 'trg_search_sku_info%' AND sql LIKE '%OR IGNORE%'")
+
+
+def test_search_results_escape_user_html(app_db):
+    query("INSERT INTO messages (sender, receiver, message, thread, timestamp) VALUES (?, ?, ?, ?, ?)",
+          ("fox", "kevin", "pickup <img src=x onerror=alert(1)> today", "<b>Dock</b>", "2025-01-01T10:00:00"),
+          fetch=False)
+    at = login("kevin", global_search="pickup")
+    hit = next(m.value for m in at.markdown if "Message" in m.value)
+    assert "<img" not in hit and "<b>" not in hit
+    assert "&lt;img" in hit and "&lt;b&gt;Dock&lt;/b&gt;" in hit
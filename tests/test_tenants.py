@@ -0,0 +1,73 @@
+import sqlite3
+import time
+
+import pytest
+
+import db
+import maintenance
+import notifier
+import tenants
+from conftest import run_app
+
+
+@pytest.fixture
+def tenant_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(tenants, "TENANT_DIR", tmp_path / "tenants")
+    monkeypatch.setattr(tenants, "MULTI_TENANT", True)
+    yield tenants.TENANT_DIR
+    db.pool.close()
+
+
+def tenant_login(tenant, username, password):
+    at = run_app()
+    at.text_input(key="login_tenant").set_value(tenant)
+    at.text_input(key="login_user").set_value(username)
+    at.text_input(key="login_pw").set_value(password)
+    return at.button(key="login_btn").click().run()
+
+
+def test_each_tenant_sees_only_its_own_users_and_hubs(tenant_dir):
+    tenants.init_tenant("acme", [("North", "Hub"), ("Store", "Retail")], "alice", "pw")
+    tenants.init_tenant("beta", tenants.DEFAULT_HUBS, "bob", "pw2")
+    assert [e.value for e in tenant_login("acme", "bob", "pw2").sidebar.error] == ["Invalid credentials"]
+
+    at = tenant_login("ACME", "alice", "pw")
+    assert not at.exception
+    at.sidebar.radio[0].set_value("Create SKU").run()
+    assert at.multiselect(key="create_sku_hubs").options == ["North", "Store"]
+    at.text_input(key="create_sku_name").set_value("Widget")
+    at.multiselect(key="create_sku_hubs").set_value(["North"])
+    at.button(key="btn_create_sku").click().run()
+
+    assert db.query("SELECT sku, hub FROM inventory", path=tenant_dir / "acme.db") == [("Widget", "North")]
+    # beta is migrated lazily, on its first login, and has none of acme's data
+    assert not db.read_once("SELECT 1 FROM sqlite_master WHERE name='inventory'", path=tenant_dir / "beta.db")
+    at = tenant_login("beta", "bob", "pw2")
+    at.sidebar.radio[0].set_value("Transfers").run()
+    assert at.selectbox(key="transfer_from").options == [h for h, _ in tenants.DEFAULT_HUBS]
+    assert db.query("SELECT COUNT(*) FROM inventory", path=tenant_dir / "beta.db") == [(0,)]
+
+
+def test_background_passes_leave_quiet_tenants_alone(tenant_dir):
+    for name in ("quiet", "busy"):
+        tenants.init_tenant(name, tenants.DEFAULT_HUBS, "admin", "pw")
+        assert not tenant_login(name, "admin", "pw").exception  # migrates the schema
+    busy = tenant_dir / "busy.db"
+    db.query("INSERT INTO outbox (created_at, kind, hub, subject) VALUES ('2025-01-01', 'low_stock', 'Hub 1', 'x')",
+             fetch=False, path=busy)
+    db.pool.close()
+
+    # Another process holds the quiet tenant's write lock: a pass must neither wait for it nor pool it
+    holder = sqlite3.connect(tenant_dir / "quiet.db", isolation_level=None)
+    holder.execute("BEGIN IMMEDIATE")
+    try:
+        start = time.perf_counter()
+        assert notifier.dispatch_all() == 1
+        for path in tenants.database_paths("maintenance_runs"):
+            maintenance.is_due(path)
+        assert time.perf_counter() - start < 1
+    finally:
+        holder.execute("ROLLBACK")
+        holder.close()
+    assert db.pool.stats()["databases"] == 1
+    assert not notifier.has_pending(busy)
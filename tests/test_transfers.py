@@ -0,0 +1,80 @@
+import reconcile
+from conftest import login
+from db import query
+
+
+def stock():
+    return dict(((sku, hub), qty) for sku, hub, qty in query("SELECT sku, hub, quantity FROM inventory"))
+
+
+def transfer_logs():
+    return query("SELECT sku, hub, action, qty, comment FROM logs WHERE comment LIKE 'Transfer %' ORDER BY hub, sku")
+
+
+def open_transfer_page(quantities):
+    """Admin on Transfers with Hub 1 → Hub 2 picked and the first grid rows set to quantities."""
+    skus = [r[0] for r in query("SELECT sku FROM inventory WHERE hub='Hub 1' ORDER BY sku LIMIT ?", (len(quantities),))]
+    for sku in skus:
+        query("UPDATE inventory SET quantity=10 WHERE sku=? AND hub='Hub 1'", (sku,), fetch=False)
+    reconcile.create_checkpoint(accept_inventory=True)
+    at = login("kevin")
+    at.sidebar.radio[0].set_value("Transfers").run()
+    at.selectbox(key="transfer_from").set_value("Hub 1").run()
+    at.selectbox(key="transfer_to").set_value("Hub 2").run()
+    rows = query("SELECT sku FROM inventory WHERE hub='Hub 1' AND quantity > 0 ORDER BY sku")
+    at.session_state["transfer_grid_Hub 1"] = {
+        "edited_rows": {rows.index((sku,)): {"Transfer": qty} for sku, qty in zip(skus, quantities)},
+        "added_rows": [], "deleted_rows": []}
+    at.run()
+    return at, skus
+
+
+def send(at):
+    at.button(key="btn_create_transfer").click().run()
+    assert not at.exception
+    return query("SELECT id FROM transfers ORDER BY id DESC LIMIT 1")[0][0]
+
+
+def test_short_line_rolls_back_the_whole_transfer(app_db):
+    at, skus = open_transfer_page([5, 4])
+    query("UPDATE inventory SET quantity=3 WHERE sku=? AND hub='Hub 1'", (skus[1],), fetch=False)  # sold meanwhile
+    before = stock()
+    at.button(key="btn_create_transfer").click().run()
+    assert not at.exception
+    assert any("Not enough stock" in w.value and skus[1] in w.value for w in at.warning)
+    assert query("SELECT COUNT(*) FROM transfers") == [(0,)]
+    assert query("SELECT COUNT(*) FROM transfer_lines") == [(0,)]
+    assert stock() == before
+    assert transfer_logs() == []
+
+
+def test_receive_books_in_once(app_db):
+    at, skus = open_transfer_page([5, 4])
+    before = stock()
+    transfer_id = send(at)
+    other_tab = login("kevin")
+    other_tab.sidebar.radio[0].set_value("Transfers").run()
+    at.button(key=f"btn_receive_transfer_{transfer_id}").click().run()
+    other_tab.button(key=f"btn_receive_transfer_{transfer_id}").click().run()  # stale page, second click
+    assert not at.exception and not other_tab.exception
+    after = stock()
+    for sku, qty in zip(skus, [5, 4]):
+        assert after[(sku, "Hub 1")] == before[(sku, "Hub 1")] - qty
+        assert after[(sku, "Hub 2")] == before.get((sku, "Hub 2"), 0) + qty
+    assert query("SELECT status FROM transfers WHERE id=?", (transfer_id,)) == [("Received",)]
+    assert sorted(transfer_logs()) == sorted(
+        [(sku, "Hub 1", "OUT", qty, f"Transfer {transfer_id}") for sku, qty in zip(skus, [5, 4])]
+        + [(sku, "Hub 2", "IN", qty, f"Transfer {transfer_id}") for sku, qty in zip(skus, [5, 4])])
+    assert len(reconcile.reconcile()["discrepancies"]) == 0
+
+
+def test_cancel_returns_stock_to_the_source(app_db):
+    at, skus = open_transfer_page([5, 4])
+    before = stock()
+    transfer_id = send(at)
+    assert stock()[(skus[0], "Hub 1")] == before[(skus[0], "Hub 1")] - 5
+    at.button(key=f"btn_cancel_transfer_{transfer_id}").click().run()
+    assert not at.exception
+    assert stock() == before
+    assert query("SELECT status FROM transfers WHERE id=?", (transfer_id,)) == [("Cancelled",)]
+    assert len(reconcile.reconcile()["discrepancies"]) == 0